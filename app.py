@@ -1,13 +1,20 @@
-from datetime import datetime
+from datetime import date, datetime
 from zoneinfo import ZoneInfo
-from flask import Flask, jsonify, send_from_directory
-import os
 import json
+import os
+import time
+from flask import Flask, Response, jsonify, request, send_file, send_from_directory
 
+import fondi_history
+import jobs
+import market_state
+import scheduler
 import scraper_etf
 import scraper_fondi
 
 from utils.logger import log_info, log_error
+from utils import metrics
+from utils.metrics import MARKET_STATUS_SECONDS
 
 app = Flask(__name__, static_folder="public", static_url_path="")
 
@@ -49,32 +56,53 @@ def health():
 
 
 # ---------------------------------------------------------
-# AGGIORNAMENTO ETF (SINCRONO)
+# AGGIORNAMENTO ETF (JOB IN BACKGROUND)
 # ---------------------------------------------------------
+def _run_update_etf(progress=None):
+    results, market_open = scraper_etf.update_all_etf(progress)
+    count = len(results) if results else 0
+    log_info("Aggiornamento ETF completato: %s ETF processati, market_open=%s", count, market_open)
+    return {
+        "status": "etf update completed",
+        "updated_symbols": count,
+        "market_open": market_open,
+        "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat(),
+        "results": results  # opzionale, utile per debug
+    }
+
+
+def _job_accepted(job):
+    return jsonify({
+        "status": job.status,
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}",
+        "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat()
+    }), 202
+
+
+def _error_response(e):
+    return jsonify({
+        "status": "error",
+        "message": f"{type(e).__name__}: {str(e)}",
+        "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat()
+    }), 500
+
+
 @app.route("/api/update-all")
 def update_etf():
-    log_info("Richiesta /api/update-all ricevuta - avvio aggiornamento ETF SINCRONO")
-    try:
-        results, market_open = scraper_etf.update_all_etf()  # Esecuzione bloccante
-        count = len(results) if results else 0
-        log_info(f"Aggiornamento ETF completato: {count} ETF processati, market_open={market_open}")
-
-        return jsonify({
-            "status": "etf update completed",
-            "updated_symbols": count,
-            "market_open": market_open,
-            "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat(),
-            "results": results  # opzionale, utile per debug
-        }), 200
+    # ?sync=1 mantiene il vecchio comportamento bloccante
+    if request.args.get("sync") == "1":
+        log_info("Richiesta /api/update-all?sync=1 ricevuta - avvio aggiornamento ETF SINCRONO")
+        try:
+            return jsonify(_run_update_etf()), 200
+        except Exception as e:
+            # FIX: logga tipo eccezione + messaggio completo per debug preciso
+            log_error("Errore durante aggiornamento ETF - Tipo: %s - Messaggio: %s", type(e).__name__, e)
+            return _error_response(e)
 
-    except Exception as e:
-        # FIX: logga tipo eccezione + messaggio completo per debug preciso
-        log_error(f"Errore durante aggiornamento ETF - Tipo: {type(e).__name__} - Messaggio: {e}")
-        return jsonify({
-            "status": "error",
-            "message": f"{type(e).__name__}: {str(e)}",
-            "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat()
-        }), 500
+    job = jobs.submit("update-all", _run_update_etf)
+    log_info("Richiesta /api/update-all ricevuta - job %s (%s)", job.id, job.status)
+    return _job_accepted(job)
 
 
 # ---------------------------------------------------------
@@ -90,27 +118,70 @@ def get_fondi_csv():
 
 
 # ---------------------------------------------------------
-# AGGIORNAMENTO FONDI (SINCRONO)
+# AGGIORNAMENTO FONDI (JOB IN BACKGROUND)
 # ---------------------------------------------------------
+def _run_update_fondi(progress=None, isins=None, force=False):
+    summary = scraper_fondi.main(progress, isins=isins, force=force)
+    log_info("Aggiornamento fondi completato con successo")
+    return {
+        "status": "fondi update completed",
+        "summary": summary,
+        "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat()
+    }
+
+
 @app.route("/api/update-fondi")
 def update_fondi():
-    log_info("Richiesta /api/update-fondi ricevuta - avvio aggiornamento fondi SINCRONO")
+    # ?isin=XS1,XS2 (anche ripetuto) aggiorna solo quei fondi; ?force=1 anche quelli controllati da poco
+    isins = sorted({i.strip() for arg in request.args.getlist("isin") for i in arg.split(",") if i.strip()})
+    force = request.args.get("force") == "1"
+
+    if request.args.get("sync") == "1":
+        log_info("Richiesta /api/update-fondi?sync=1 ricevuta - avvio aggiornamento fondi SINCRONO")
+        try:
+            return jsonify(_run_update_fondi(isins=isins, force=force)), 200
+        except Exception as e:
+            log_error("Errore durante aggiornamento fondi - Tipo: %s - Messaggio: %s", type(e).__name__, e)
+            return _error_response(e)
+
+    # Il tipo di job include il filtro: richieste uguali si accodano allo stesso job
+    kind = "update-fondi" + (f":{','.join(isins)}" if isins else "") + (":force" if force else "")
+    job = jobs.submit(kind, lambda progress: _run_update_fondi(progress, isins=isins, force=force))
+    log_info("Richiesta /api/update-fondi ricevuta - job %s (%s)", job.id, job.status)
+    return _job_accepted(job)
+
+
+# ---------------------------------------------------------
+# STORICO NAV FONDI
+# ---------------------------------------------------------
+@app.route("/api/fondi/<isin>/history")
+def fondi_history_api(isin):
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD&points=N (serie ridotta a ~N punti, default 500)"""
     try:
-        scraper_fondi.main()
-        log_info("Aggiornamento fondi completato con successo")
+        start = date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        end = date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        points = int(request.args.get("points", fondi_history.DEFAULT_POINTS))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Parametri non validi: {e}"}), 400
 
-        return jsonify({
-            "status": "fondi update completed",
-            "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat()
-        }), 200
+    data = fondi_history.series(isin, start, end, points)
+    if not data and isin not in fondi_history.get_store().keys():
+        return jsonify({"status": "not_found", "isin": isin}), 404
 
-    except Exception as e:
-        log_error(f"Errore durante aggiornamento fondi - Tipo: {type(e).__name__} - Messaggio: {e}")
-        return jsonify({
-            "status": "error",
-            "message": f"{type(e).__name__}: {str(e)}",
-            "timestamp": datetime.now(ZoneInfo("Europe/Rome")).isoformat()
-        }), 500
+    resp = jsonify({"isin": isin, "count": len(data), "points": data})
+    resp.headers["Cache-Control"] = "public, max-age=300"
+    return resp
+
+
+# ---------------------------------------------------------
+# STATO JOB
+# ---------------------------------------------------------
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "not_found", "job_id": job_id}), 404
+    return jsonify(job.to_dict()), 200
 
 
 # ---------------------------------------------------------
@@ -120,14 +191,22 @@ def update_fondi():
 def market_status():
     """
     Legge SOLO data/market.json scritto da scraper_etf.update_all_etf().
-    Non fa scraping né aggiornamenti.
+    Non fa scraping né aggiornamenti: il documento è tenuto in memoria (market_state)
+    e riletto solo quando il file cambia. Supporta ETag / If-None-Match (304).
     """
-    market_path = os.path.join("data", "market.json")
+    t0 = time.perf_counter()
+    resp = app.make_response(_market_status())
+    MARKET_STATUS_SECONDS.observe(time.perf_counter() - t0, code=resp.status_code)
+    return resp
 
+
+def _market_status():
     now_rome = datetime.now(ZoneInfo("Europe/Rome"))
     readable = now_rome.strftime("%H:%M %d-%m-%Y")
 
-    if not os.path.exists(market_path):
+    try:
+        snapshot = market_state.current_snapshot()
+    except FileNotFoundError:
         return jsonify({
             "datetime": now_rome.isoformat(),
             "datetime_readable": readable,
@@ -136,16 +215,6 @@ def market_status():
             "values": {"source": "none", "data": []},
             "error": "market.json non trovato"
         }), 200
-
-    try:
-        with open(market_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        data["datetime"] = now_rome.isoformat()
-        data["datetime_readable"] = readable
-
-        return jsonify(data), 200
-
     except Exception as e:
         return jsonify({
             "datetime": now_rome.isoformat(),
@@ -156,6 +225,132 @@ def market_status():
             "error": f"Errore lettura market.json: {e}"
         }), 500
 
+    encoding = _preferred_encoding()
+    body, etag = snapshot.render(now_rome.replace(second=0, microsecond=0), encoding)
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, status=200, mimetype="application/json")
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
+def _preferred_encoding():
+    """Codifica da usare secondo Accept-Encoding (br se disponibile, poi gzip), None = nessuna."""
+    for encoding in market_state.supported_encodings():
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+@app.route("/market.json")
+def market_json():
+    """market.json così com'è su disco, nella variante precompressa adatta al client (sendfile)."""
+    encoding = _preferred_encoding()
+    path = market_state.MARKET_PATH
+    if encoding:
+        suffix = next(s for s, e in market_state.ENCODINGS.items() if e == encoding)
+        if os.path.exists(path + suffix):
+            path += suffix
+        else:
+            encoding = None
+    if not os.path.exists(path):
+        return jsonify({"status": "not_found", "error": "market.json non trovato"}), 404
+
+    resp = send_file(path, mimetype="application/json", conditional=True, max_age=0)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+# ---------------------------------------------------------
+# MARKET STREAM (Server-Sent Events)
+# ---------------------------------------------------------
+STREAM_POLL = 2          # secondi: ricontrollo del file (scritture da altri worker)
+STREAM_HEARTBEAT = 15    # secondi tra due heartbeat
+STREAM_MAX_AGE = 600     # secondi: poi il client si riconnette da solo (Last-Event-ID)
+
+
+@app.route("/api/market-stream")
+def market_stream():
+    """
+    Invia lo snapshot di market.json solo quando cambia (evento "market", id = versione),
+    più un evento "heartbeat" periodico con l'ora corrente.
+    Con Last-Event-ID uguale alla versione corrente non viene re-inviato nulla.
+    """
+    if not market_state.acquire_stream():
+        resp = jsonify({"status": "busy", "error": "troppi stream aperti, usare /api/market-status"})
+        resp.headers["Retry-After"] = "60"
+        return resp, 503
+
+    # Lo slot si rilascia alla chiusura della risposta (anche se il generatore non parte mai,
+    # es. client disconnesso prima del primo chunk), una sola volta
+    release = market_state.stream_releaser()
+    last_id = request.headers.get("Last-Event-ID")
+
+    def generate():
+        yield "retry: 5000\n\n"
+        last_sent = last_id
+        last_beat = time.monotonic()
+        stop_at = last_beat + STREAM_MAX_AGE
+        while time.monotonic() < stop_at:
+            seen = market_state.generation()
+            now_rome = datetime.now(ZoneInfo("Europe/Rome"))
+            try:
+                snapshot = market_state.current_snapshot()
+            except Exception:
+                snapshot = None
+
+            if snapshot is not None and snapshot.version != last_sent:
+                body, _ = snapshot.render(now_rome.replace(second=0, microsecond=0))
+                yield f"id: {snapshot.version}\nevent: market\ndata: {body.decode('utf-8')}\n\n"
+                last_sent = snapshot.version
+                last_beat = time.monotonic()
+            elif time.monotonic() - last_beat >= STREAM_HEARTBEAT:
+                beat = json.dumps({"datetime_readable": now_rome.strftime("%H:%M %d-%m-%Y")})
+                yield f"event: heartbeat\ndata: {beat}\n\n"
+                last_beat = time.monotonic()
+
+            market_state.wait_published(seen, STREAM_POLL)
+
+    try:
+        resp = Response(generate(), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+    except Exception:
+        release()
+        raise
+    resp.call_on_close(release)
+    return resp
+
+
+# ---------------------------------------------------------
+# METRICHE (formato testo Prometheus)
+# ---------------------------------------------------------
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------------------------------------------------------
+# SCHEDULER INTERNO (SCHEDULER_ENABLED=1, sostituisce il cron esterno)
+# ---------------------------------------------------------
+@app.route("/api/scheduler")
+def scheduler_status():
+    return jsonify(scheduler.status())
+
+
+if scheduler.enabled():
+    scheduler.start(_run_update_etf)
+
 
 # ---------------------------------------------------------
 # AVVIO SERVER (solo in locale)
@@ -1,100 +1,442 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import json
 import os
-import base64
-import requests
+import sqlite3
+import sys
 from datetime import datetime
+from github_publisher import Publisher
 from supabase_client import get_supabase
 from utils.logger import log_info, log_error
 
-def run_supabase_backup():
-    table_name = "previous_close"
-    folder = "backup_SQL"
-    filename = f"backup_supabase_{datetime.now().strftime('%Y_%m_%d')}.sql"
+TABLE_NAME = "previous_close"
+PAGE_SIZE = 1000         # righe per pagina (limite PostgREST)
+ROWS_PER_INSERT = 250    # righe per singola INSERT multi-riga
+
+BACKUP_FOLDER = "backup_SQL"
+MANIFEST_NAME = "manifest.json"
+FULL_EVERY = 4           # un backup completo ogni 4 (gli altri sono incrementali)
+CHAINS_TO_KEEP = 2       # catene (completo + incrementali) conservate
+
+CONFLICT_KEY = ("symbol", "snapshot_date")
+
+def sql_value(v):
+    if v is None:
+        return "NULL"
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, (int, float)):
+        return str(v)
+    # Raddoppia gli apici per SQL e avvolge tra apici singoli
+    safe_v = str(v).replace("'", "''")
+    return f"'{safe_v}'"
+
+def write_inserts(f, table_name, rows, cols, upsert=False):
+    suffix = ""
+    if upsert:
+        # Negli incrementali la stessa riga può tornare aggiornata: si riscrive sulla chiave logica
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols if c != "id" and c not in CONFLICT_KEY)
+        suffix = f"\nON CONFLICT ({', '.join(CONFLICT_KEY)}) DO UPDATE SET {updates}"
+    for i in range(0, len(rows), ROWS_PER_INSERT):
+        chunk = rows[i:i + ROWS_PER_INSERT]
+        values = ",\n".join("(" + ", ".join(sql_value(row.get(c)) for c in cols) + ")" for row in chunk)
+        f.write(f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES\n{values}{suffix};\n")
+
+def iter_pages(supabase, table_name, page_size=PAGE_SIZE):
+    """Pagine ordinate per (snapshot_date, id) con keyset pagination: niente OFFSET, niente troncamenti."""
+    last = None
+    while True:
+        query = supabase.table(table_name).select("*")
+        if last is not None:
+            d, i = last
+            query = query.or_(f"snapshot_date.gt.{d},and(snapshot_date.eq.{d},id.gt.{i})")
+        rows = query.order("snapshot_date").order("id").limit(page_size).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = (rows[-1]["snapshot_date"], rows[-1]["id"])
+
+def iter_changed_pages(supabase, table_name, max_id, last_date, page_size=PAGE_SIZE):
+    """
+    Righe nuove (id oltre il watermark) o dell'ultimo giorno già salvato (che può essere
+    stato riscritto dagli upsert della giornata). Keyset pagination su id.
+    """
+    last_id = 0
+    while True:
+        rows = (
+            supabase.table(table_name).select("*")
+            .or_(f"id.gt.{max_id},snapshot_date.gte.{last_date}")
+            .gt("id", last_id)
+            .order("id").limit(page_size).execute().data or []
+        )
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+def count_rows(supabase, table_name):
+    """Conteggio esatto lato Supabase (None se non disponibile)."""
+    try:
+        return supabase.table(table_name).select("id", count="exact").limit(1).execute().count
+    except Exception as e:
+        log_error(f"Conteggio righe {table_name} non disponibile: {e}")
+        return None
+
+# ---------------------------------------------------------
+# CHECKSUM DELLO STATO (indipendente dall'ordine delle righe)
+# ---------------------------------------------------------
+# Somma modulo 2^64 di un hash per riga: si aggiorna riga per riga sia durante l'export
+# (anche incrementale) sia sulla tabella ripristinata, e i due valori devono coincidere.
+def _num(v):
+    return "" if v is None else repr(float(v))
+
+def row_key(row):
+    return f"{row['symbol']}|{str(row['snapshot_date'])[:10]}"
+
+def row_hash(row):
+    text = f"{row_key(row)}|{_num(row.get('close_value'))}|{row.get('label') or ''}|{_num(row.get('daily_change'))}"
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+class ChainState:
+    """Watermark e checksum accumulati lungo la catena di backup."""
+
+    def __init__(self, link=None):
+        link = link or {}
+        self.max_id = link.get("max_id", 0)
+        self.last_date = link.get("last_date")
+        self.tail = dict(link.get("tail", {}))  # row_key -> hash, righe di last_date
+        self.rows = link.get("state_rows", 0)
+        self.sum = int(link.get("state_sum", "0"), 16)
+
+    def apply(self, row, old_tail):
+        h = row_hash(row)
+        key = row_key(row)
+        if key in old_tail:
+            self.sum -= old_tail.pop(key)  # riga riscritta: sostituisce quella già nello stato
+        else:
+            self.rows += 1
+        self.sum = (self.sum + h) % 2**64
+        self.max_id = max(self.max_id, row["id"])
+
+        d = str(row["snapshot_date"])[:10]
+        if self.last_date is None or d > self.last_date:
+            self.last_date = d
+            self.tail = {}
+        if d == self.last_date:
+            self.tail[key] = h
+
+    def fields(self):
+        return {
+            "max_id": self.max_id,
+            "last_date": self.last_date,
+            "tail": self.tail,
+            "state_rows": self.rows,
+            "state_sum": f"{self.sum:016x}",
+        }
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# ---------------------------------------------------------
+# MANIFEST DELLA CATENA
+# ---------------------------------------------------------
+def manifest_path(folder=BACKUP_FOLDER):
+    return os.path.join(folder, MANIFEST_NAME)
+
+def load_manifest(folder=BACKUP_FOLDER):
+    try:
+        with open(manifest_path(folder), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"table": TABLE_NAME, "links": []}
+
+def save_manifest(manifest, folder=BACKUP_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    tmp = manifest_path(folder) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path(folder))
+
+def current_chain(links):
+    """Ultimo backup completo e gli incrementali successivi (quello che serve per il ripristino)."""
+    fulls = [i for i, link in enumerate(links) if link["kind"] == "full"]
+    return links[fulls[-1]:] if fulls else []
+
+def kept_links(links):
+    fulls = [i for i, link in enumerate(links) if link["kind"] == "full"]
+    return links[fulls[-CHAINS_TO_KEEP]:] if len(fulls) >= CHAINS_TO_KEEP else links
+
+def can_prune(manifest):
+    """
+    I file fuori manifest (es. i vecchi dump backup_supabase_*.sql precedenti alla catena)
+    si cancellano solo quando il manifest ha già CHAINS_TO_KEEP catene complete.
+    """
+    return sum(1 for link in manifest["links"] if link["kind"] == "full") >= CHAINS_TO_KEEP
+
+# ---------------------------------------------------------
+# BACKUP (completo o incrementale)
+# ---------------------------------------------------------
+def _export(table_name, file_path, pages, state, upsert):
+    total = 0
+    cols = None
+    old_tail = dict(state.tail) if upsert else {}
+
+    # Scrittura in streaming, pagina per pagina: la tabella non sta mai tutta in memoria
+    with gzip.open(file_path, "wt", encoding="utf-8", compresslevel=9) as f:
+        kind = "INCREMENTALE" if upsert else "COMPLETO"
+        f.write(f"-- BACKUP AUTOMATICO ({kind}): {table_name}\n\n")
+        if not upsert:
+            f.write(f"TRUNCATE TABLE {table_name};\n\n")
+
+        for rows in pages:
+            if cols is None:
+                cols = list(rows[0].keys())
+            write_inserts(f, table_name, rows, cols, upsert=upsert)
+            for row in rows:
+                state.apply(row, old_tail)
+            total += len(rows)
+    return total
+
+def run_supabase_backup(full=False, folder=BACKUP_FOLDER):
+    """
+    Esporta le righe cambiate dall'ultimo backup (o tutta la tabella ogni FULL_EVERY run)
+    e aggiunge l'anello al manifest. Ritorna il percorso del file o None.
+    """
+    table_name = TABLE_NAME
+    manifest = load_manifest(folder)
+    chain = current_chain(manifest["links"])
+    incremental = bool(chain) and not full and len(chain) < FULL_EVERY
+
+    stamp = datetime.now().strftime('%Y_%m_%d_%H%M')
+    filename = f"backup_supabase_{stamp}{'.incr' if incremental else ''}.sql.gz"
+    used = {link["file"] for link in manifest["links"]}
+    n = 1
+    while filename in used:  # più backup nello stesso minuto: il nome non deve sovrascrivere un anello
+        n += 1
+        filename = f"backup_supabase_{stamp}_{n}{'.incr' if incremental else ''}.sql.gz"
     file_path = os.path.join(folder, filename)
-    
+
     log_info(f"Inizio generazione backup SQL: {filename}")
-    
+
     try:
-        # Recupero dati da Supabase
         supabase = get_supabase()
-        resp = supabase.table(table_name).select("*").order("snapshot_date", desc=True).execute()
-        rows = resp.data
-        if not rows: 
-            return None
-        
         os.makedirs(folder, exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(f"-- BACKUP AUTOMATICO: {table_name}\n\n")
-            f.write(f"TRUNCATE TABLE {table_name};\n\n")
-            
-            for row in rows:
-                cols = ", ".join(row.keys())
-                
-                vals_list = []
-                for v in row.values():
-                    if v is None:
-                        vals_list.append("NULL")
-                    elif isinstance(v, (int, float)):
-                        vals_list.append(str(v))
-                    else:
-                        # Raddoppia gli apici per SQL e avvolge tra apici singoli
-                        safe_v = str(v).replace("'", "''")
-                        vals_list.append(f"'{safe_v}'")
-                
-                vals_string = ", ".join(vals_list)
-                f.write(f"INSERT INTO {table_name} ({cols}) VALUES ({vals_string});\n")
-                # ----------------------------------
-        
-        log_info(f"Backup locale completato: {file_path}")
+
+        if incremental:
+            prev = chain[-1]
+            state = ChainState(prev)
+            pages = iter_changed_pages(supabase, table_name, prev["max_id"], prev["last_date"])
+            total = _export(table_name, file_path, pages, state, upsert=True)
+            unchanged = (state.sum, state.rows, state.max_id) == (int(prev["state_sum"], 16), prev["state_rows"], prev["max_id"])
+            if unchanged:
+                os.remove(file_path)
+                log_info("Backup incrementale: nessuna riga cambiata – niente da salvare")
+                return None
+        else:
+            state = ChainState()
+            total = _export(table_name, file_path, iter_pages(supabase, table_name), state, upsert=False)
+            if not total:
+                os.remove(file_path)
+                return None
+
+        table_rows = count_rows(supabase, table_name)
+        if incremental and table_rows is not None and table_rows != state.rows:
+            # Righe cancellate in Supabase (l'incrementale non le vede): si riparte con un completo
+            log_error(f"Backup incrementale incoerente ({state.rows} righe attese, {table_rows} in tabella): eseguo backup completo")
+            os.remove(file_path)
+            return run_supabase_backup(full=True, folder=folder)
+
+        link = {
+            "file": filename,
+            "kind": "incremental" if incremental else "full",
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "rows": total,
+            "bytes": os.path.getsize(file_path),
+            "sha256": file_sha256(file_path),
+            "table_rows": table_rows,
+            **state.fields(),
+        }
+        manifest["links"] = kept_links(manifest["links"] + [link])
+        save_manifest(manifest, folder)
+        _prune_local(manifest, folder)
+
+        log_info(f"Backup locale completato: {file_path} ({link['kind']}, {total} righe, {link['bytes']} byte)")
         return file_path
     except Exception as e:
         log_error(f"Errore generazione backup: {e}")
+        if os.path.exists(file_path):
+            os.remove(file_path)
         return None
 
+def _is_backup_file(name):
+    return name.startswith("backup_supabase_") and name.endswith((".sql", ".sql.gz"))
+
+def _prune_local(manifest, folder):
+    if not can_prune(manifest):
+        return
+    keep = {link["file"] for link in manifest["links"]}
+    for path in glob.glob(os.path.join(folder, "backup_supabase_*")):
+        name = os.path.basename(path)
+        if _is_backup_file(name) and name not in keep:
+            os.remove(path)
+            log_info(f"Rimozione vecchio backup locale: {name}")
+
+# ---------------------------------------------------------
+# UPLOAD SU GITHUB (rotazione che preserva la catena)
+# ---------------------------------------------------------
+def stage_backup(publisher, file_path):
+    """
+    Aggiunge al commit della run il manifest e i file della catena (quelli invariati
+    vengono saltati dal Publisher) e marca per la cancellazione i backup fuori catena
+    (solo quando ci sono CHAINS_TO_KEEP catene complete, vedi can_prune).
+    """
+    folder = os.path.dirname(file_path) or BACKUP_FOLDER
+    manifest = load_manifest(folder)
+    keep = {link["file"] for link in manifest["links"]}
+
+    for name in sorted(keep):
+        local = os.path.join(folder, name)
+        if os.path.exists(local):
+            publisher.add(f"{BACKUP_FOLDER}/{name}", local)
+    publisher.add(f"{BACKUP_FOLDER}/{MANIFEST_NAME}", manifest_path(folder))
+
+    if not can_prune(manifest):
+        return
+    for old_path in publisher.remote_paths(f"{BACKUP_FOLDER}/"):
+        name = os.path.basename(old_path)
+        if _is_backup_file(name) and name not in keep:
+            publisher.delete(old_path)
+            log_info(f"Rimozione vecchio backup da GitHub: {name}")
+
 def upload_backup_to_github(file_path):
-    """Carica il backup e mantiene solo gli ultimi 3 file nella cartella backup_SQL."""
-    token = os.environ.get("GITHUB_TOKEN")
-    repo = "Marchino1978/portfolio"
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-    
-    file_name = os.path.basename(file_path)
-    api_url_base = f"https://api.github.com/repos/{repo}/contents/backup_SQL"
-    
+    """Carica il backup e la catena corrente nella cartella backup_SQL (un solo commit)."""
+    publisher = Publisher()
+    stage_backup(publisher, file_path)
+    return publisher.publish()
+
+# ---------------------------------------------------------
+# RIPRISTINO (Postgres o SQLite locale)
+# ---------------------------------------------------------
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    close_value NUMERIC NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    label TEXT,
+    daily_change NUMERIC,
+    inserted_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS unique_symbol_date ON {TABLE_NAME} (symbol, snapshot_date);
+"""
+
+def _connect_postgres(dsn):
     try:
-        with open(file_path, "rb") as f:
-            content = base64.b64encode(f.read()).decode("utf-8")
-        
-        put_resp = requests.put(f"{api_url_base}/{file_name}", headers=headers, json={
-            "message": "fix",
-            "content": content,
-            "branch": "main"
-        }, timeout=10)
-        
-        if put_resp.status_code in [200, 201]:
-            log_info(f"Nuovo backup {file_name} caricato in backup_SQL.")
-        else:
-            log_error(f"Errore upload GitHub: {put_resp.text}")
-
-        # Rotazione backup (ne tiene 3)
-        resp = requests.get(api_url_base, headers=headers, timeout=10)
-        if resp.status_code == 200:
-            files = resp.json()
-            backups = sorted([f for f in files if f['name'].endswith(".sql")], 
-                            key=lambda x: x['name'], reverse=True)
-
-            if len(backups) > 3:
-                for old_file in backups[3:]:
-                    del_url = f"https://api.github.com/repos/{repo}/contents/{old_file['path']}"
-                    requests.delete(del_url, headers=headers, json={
-                        "message": "fix",
-                        "sha": old_file['sha'],
-                        "branch": "main"
-                    }, timeout=10)
-                    log_info(f"Rimosso vecchio backup da GitHub: {old_file['name']}")
+        import psycopg
+        return psycopg.connect(dsn)
+    except ImportError:
+        import psycopg2  # fallback se è installato solo psycopg2
+        return psycopg2.connect(dsn)
 
-    except Exception as e:
-        log_error(f"Errore durante rotazione backup su GitHub: {e}")
+def _statements(lines):
+    """
+    Istruzioni complete lette riga per riga (i ';' dentro le stringhe non spezzano):
+    del file decompresso si tiene in memoria una sola INSERT alla volta.
+    """
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if line.rstrip().endswith(";") and sqlite3.complete_statement("".join(buf)):
+            yield "".join(buf)
+            buf = []
+
+def restore(sqlite_path=None, dsn=None, folder=BACKUP_FOLDER):
+    """
+    Riesegue la catena corrente (completo + incrementali) sul database indicato, in una
+    sola transazione, e verifica sha256 dei file, numero di righe e checksum dello stato.
+    Ritorna True se il ripristino è coerente con il manifest.
+    """
+    chain = current_chain(load_manifest(folder)["links"])
+    if not chain:
+        log_error(f"Nessun backup completo in {folder}/{MANIFEST_NAME}")
+        return False
+
+    for link in chain:
+        path = os.path.join(folder, link["file"])
+        if not os.path.exists(path) or file_sha256(path) != link["sha256"]:
+            log_error(f"File della catena mancante o alterato: {link['file']}")
+            return False
+
+    start = datetime.now()
+    if sqlite_path:
+        conn = sqlite3.connect(sqlite_path)
+        conn.executescript(SQLITE_SCHEMA)
+    else:
+        conn = _connect_postgres(dsn)
+
+    try:
+        cur = conn.cursor()
+        if sqlite_path:
+            cur.execute("BEGIN")
+        for link in chain:
+            with gzip.open(os.path.join(folder, link["file"]), "rt", encoding="utf-8") as f:
+                for statement in _statements(f):
+                    if sqlite_path and statement.rstrip().endswith(f"TRUNCATE TABLE {TABLE_NAME};"):
+                        statement = f"DELETE FROM {TABLE_NAME};"  # SQLite non ha TRUNCATE
+                    cur.execute(statement)
+            log_info(f"Ripristinato {link['file']} ({link['kind']}, {link['rows']} righe)")
+        if not sqlite_path:
+            # gli id sono ripristinati espliciti: la sequenza va riallineata, altrimenti
+            # la prossima INSERT senza id collide con una riga esistente
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE_NAME}', 'id'), max(id)) FROM {TABLE_NAME}")
+        conn.commit()
+
+        cur.execute(f"SELECT symbol, snapshot_date, close_value, label, daily_change FROM {TABLE_NAME}")
+        rows, total = 0, 0
+        for symbol, snapshot_date, close_value, label, daily_change in cur:
+            rows += 1
+            total = (total + row_hash({
+                "symbol": symbol, "snapshot_date": snapshot_date, "close_value": close_value,
+                "label": label, "daily_change": daily_change,
+            })) % 2**64
+    finally:
+        conn.close()
+
+    last = chain[-1]
+    elapsed = (datetime.now() - start).total_seconds()
+    ok = rows == last["state_rows"] and f"{total:016x}" == last["state_sum"]
+    if last.get("table_rows") is not None and last["table_rows"] != rows:
+        log_error(f"Righe ripristinate {rows}, in Supabase al momento del backup {last['table_rows']}")
+        ok = False
+    if ok:
+        log_info(f"Ripristino OK: {len(chain)} file, {rows} righe, checksum {last['state_sum']} ({elapsed:.2f}s)")
+    else:
+        log_error(f"Ripristino NON coerente: {rows} righe (attese {last['state_rows']}), checksum {total:016x} (atteso {last['state_sum']})")
+    return ok
 
 if __name__ == "__main__":
-    path = run_supabase_backup()
-    if path: 
-        upload_backup_to_github(path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Backup incrementale / ripristino di previous_close")
+    sub = parser.add_subparsers(dest="command")
+    backup_cmd = sub.add_parser("backup", help="backup (incrementale se possibile) e upload su GitHub")
+    backup_cmd.add_argument("--full", action="store_true", help="forza un backup completo")
+    restore_cmd = sub.add_parser("restore", help="riesegue la catena su Postgres o SQLite")
+    target = restore_cmd.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sqlite", help="file SQLite di destinazione")
+    target.add_argument("--dsn", help="connection string Postgres (richiede psycopg)")
+    restore_cmd.add_argument("--folder", default=BACKUP_FOLDER)
+    args = parser.parse_args()
+
+    if args.command == "restore":
+        sys.exit(0 if restore(sqlite_path=args.sqlite, dsn=args.dsn, folder=args.folder) else 1)
+
+    path = run_supabase_backup(full=getattr(args, "full", False))
+    if path:
+        upload_backup_to_github(path)
@@ -1,10 +1,13 @@
 import os
 import json
+import time
 from datetime import datetime
 import telebot
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
+from check_alert import get_config
 from utils.logger import log_info, log_error
+from utils.metrics import observe_http
 
 # Carica le variabili dal file .env
 load_dotenv()
@@ -14,6 +17,21 @@ CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 # Inizializza il bot
 bot = telebot.TeleBot(TOKEN)
+TELEGRAM_HOST = "api.telegram.org"
+
+def send_message(text, **kwargs):
+    """bot.send_message con latenza ed esito nelle metriche HTTP (host api.telegram.org)."""
+    t0 = time.perf_counter()
+    try:
+        result = bot.send_message(CHAT_ID, text, **kwargs)
+    except telebot.apihelper.ApiTelegramException as e:
+        observe_http(TELEGRAM_HOST, e.error_code, time.perf_counter() - t0)
+        raise
+    except Exception:
+        observe_http(TELEGRAM_HOST, "error", time.perf_counter() - t0)
+        raise
+    observe_http(TELEGRAM_HOST, 200, time.perf_counter() - t0)
+    return result
 
 def send_monthly_report():
     """
@@ -50,37 +68,32 @@ def send_monthly_report():
         titolo = f"📊 *REPORT ETF - {nomi_mesi[mese_index]} {anno}*\n"
         titolo += "--------------------------------------------------\n\n"
 
+        # Codice periodo di v_bot (variations.conf), per leggere il valore grezzo
+        codice_bot = get_config().get("v_bot", "M")
+
         messaggio = titolo
         for etf in etfs:
             nome = etf.get("label", etf["symbol"])
             variazione_str = etf.get("v_bot", "N/A")
+            val_num = etf.get("variations", {}).get(codice_bot)
             prezzo = etf.get("price", 0.0)
             
             # --- LOGICA COLORI ---
-            icona = "🔵" # AZZURRO per N/A o Errori
-            
-            if variazione_str != "N/A":
-                try:
-                    # Pulizia della stringa
-                    parte_numerica = variazione_str.split('%')[0]
-                    val_pulito = parte_numerica.replace(',', '.').replace('+', '').strip()
-                    val_num = float(val_pulito)
-                    
-                    if val_num > 0:
-                        icona = "🟢" # VERDE per Positivo
-                    elif val_num < 0:
-                        icona = "🔴" # ROSSO per Negativo
-                    else:
-                        icona = "⚪" # BIANCO per Zero
-                except Exception:
-                    icona = "🔵" # AZZURRO per N/A o Errori
+            if val_num is None:
+                icona = "🔵" # AZZURRO per N/A o Errori
+            elif val_num > 0:
+                icona = "🟢" # VERDE per Positivo
+            elif val_num < 0:
+                icona = "🔴" # ROSSO per Negativo
+            else:
+                icona = "⚪" # BIANCO per Zero
             
             # Formattazione riga con icona allineata
             messaggio += f"{icona} *{nome}*\n"
             messaggio += f"   Price: €{prezzo:.2f} | Var: `{variazione_str}`\n\n"
 
         # Invio effettivo a Telegram
-        bot.send_message(CHAT_ID, messaggio, parse_mode="Markdown")
+        send_message(messaggio, parse_mode="Markdown")
         log_info(f"Telegram: Report mensile {nomi_mesi[mese_index]} inviato con logica colori ESP32.")
 
     except Exception as e:
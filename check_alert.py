@@ -1,9 +1,12 @@
 import os
 import json
+import time
 import requests
+from urllib.parse import urlsplit
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from utils.logger import log_info, log_error
+from utils.metrics import observe_http
 
 def get_config():
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -41,13 +44,11 @@ def check_alert():
         etfs = data.get("values", {}).get("data", [])
         best_idx = -1
 
+        code = conf.get("v_alert", "M")
+
         for etf in etfs:
-            v = etf.get("v_alert", "N/A")
-            if v == "N/A": continue
-            
-            val_str = v.replace("%", "").replace("+", "").strip()
-            if val_str and val_str[-1].isalpha(): val_str = val_str[:-1]
-            val = float(val_str)
+            val = etf.get("variations", {}).get(code)
+            if val is None: continue
 
             if val <= float(conf["s_alert_6"]):   idx = 6
             elif val <= float(conf["s_alert_5"]): idx = 5
@@ -61,7 +62,14 @@ def check_alert():
             if idx > best_idx: best_idx = idx
 
         if best_idx != -1:
-            requests.get(urls[best_idx], timeout=10)
+            host = urlsplit(urls[best_idx]).netloc
+            t0 = time.perf_counter()
+            try:
+                r = requests.get(urls[best_idx], timeout=10)
+            except Exception:
+                observe_http(host, "error", time.perf_counter() - t0)
+                raise
+            observe_http(host, r.status_code, time.perf_counter() - t0)
             log_info(f"ALERTER: Attivato Switch_{best_idx}")
             return "triggered"
 
@@ -0,0 +1,114 @@
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from github_publisher import blob_sha
+from utils.logger import log_info
+from utils.series_store import SeriesStore
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DIR = os.path.join(BASE_DIR, "data", "fondi_history")
+REPO_DIR = "data/fondi_history"
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+
+# ---------------------------------------------------------
+# STORICO NAV PER ISIN (append-only, un punto per giorno)
+# ---------------------------------------------------------
+# Stesse colonne binarie del mirror prezzi (utils.series_store): <ISIN>.dates / <ISIN>.values.
+# Un aggiornamento nello stesso giorno sovrascrive l'ultimo punto, i giorni nuovi si
+# aggiungono in coda: il file non viene mai riscritto per intero.
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = SeriesStore(HISTORY_DIR)
+    return _store
+
+
+def record(isin, day, nav):
+    """Registra il NAV del giorno (sabato e domenica no: è il NAV del venerdì)."""
+    if day.weekday() >= 5:
+        return False
+    get_store().upsert(isin, {day.toordinal(): float(nav)})
+    return True
+
+
+def repo_files(isin):
+    """Percorsi (repo, locale) delle colonne di un ISIN, per la pubblicazione su GitHub."""
+    return [(f"{REPO_DIR}/{os.path.basename(path)}", path) for path in get_store().paths(isin)]
+
+
+def _local_sha(path):
+    try:
+        with open(path, "rb") as f:
+            return blob_sha(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def merge_remote(isin, publisher):
+    """
+    Il disco è effimero: dopo un riavvio le colonne locali possono essere più vecchie di
+    quelle su GitHub, e pubblicarle cancellerebbe lo storico. Se le copie differiscono, i
+    giorni presenti solo su GitHub vengono fusi nello store locale. Va chiamata prima di
+    record(); ritorna il numero di punti recuperati. Le eccezioni (rete) si propagano.
+    """
+    files = repo_files(isin)
+    if all(publisher.remote_sha(repo) == _local_sha(local) for repo, local in files):
+        return 0
+    contents = [publisher.fetch(repo) for repo, _ in files]
+    if any(c is None for c in contents):
+        return 0
+
+    dates, values = array("i"), array("d")
+    dates.frombytes(contents[0])
+    values.frombytes(contents[1])
+    store = get_store()
+    local = set(store.columns(isin)[0].tolist())
+    missing = {d: v for d, v in zip(dates, values) if d not in local}
+    store.upsert(isin, missing)
+    if missing:
+        log_info(f"Storico NAV {isin}: {len(missing)} punti recuperati da GitHub")
+    return len(missing)
+
+
+def downsample(dates, values, points):
+    """
+    Riduce la serie a circa `points` punti: per ogni bucket tiene minimo e massimo
+    (nell'ordine in cui compaiono), così picchi e minimi restano visibili nel grafico.
+    """
+    n = len(dates)
+    if n <= points:
+        return list(zip(dates, values))
+    buckets = max(1, points // 2)
+    out = []
+    for b in range(buckets):
+        lo, hi = b * n // buckets, (b + 1) * n // buckets
+        if lo >= hi:
+            continue
+        chunk = values[lo:hi]
+        i_min = lo + min(range(len(chunk)), key=chunk.__getitem__)
+        i_max = lo + max(range(len(chunk)), key=chunk.__getitem__)
+        for i in sorted({i_min, i_max}):
+            out.append((dates[i], values[i]))
+    if out[-1][0] != dates[-1]:
+        out.append((dates[-1], values[-1]))
+    return out
+
+
+def series(isin, start=None, end=None, points=DEFAULT_POINTS):
+    """
+    Serie [(data ISO, nav)] tra start ed end (date, inclusi) ridotta a ~points punti.
+    L'intervallo si trova con bisect sulle date ordinate: si legge solo quella fetta.
+    """
+    dates, values = get_store().columns(isin)
+    lo = bisect_left(dates, start.toordinal()) if start else 0
+    hi = bisect_right(dates, end.toordinal()) if end else len(dates)
+    sampled = downsample(dates[lo:hi].tolist(), values[lo:hi].tolist(), max(2, min(points, MAX_POINTS)))
+    return [(date.fromordinal(d).isoformat(), v) for d, v in sampled]
@@ -0,0 +1,221 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from utils.fetcher import get_session
+from utils.logger import log_info, log_error, log_warning
+from utils.metrics import observe_http
+
+REPO = "Marchino1978/portfolio"
+BRANCH = "main"
+API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+TIMEOUT = 15
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_DIR, "data", ".github_publish.json")
+_cache_lock = threading.Lock()  # più Publisher nello stesso processo scrivono la stessa cache
+
+
+def blob_sha(content):
+    """SHA del blob git (stesso valore che GitHub riporta nel tree)."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+# ---------------------------------------------------------
+# PUBBLICAZIONE SU GITHUB (un commit per run, via Git Data API)
+# ---------------------------------------------------------
+class Publisher:
+    """
+    Raccoglie i file da pubblicare (e da cancellare) e li scrive in UN commit.
+    I file invariati (hash locale == SHA remoto in cache) vengono saltati:
+    se nulla è cambiato non parte nessuna richiesta.
+    """
+
+    def __init__(self, token=None, message="fix"):
+        self.token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        self.message = message
+        self.files = {}      # repo_path -> bytes
+        self.deletions = set()
+        self._cache = None
+        self._synced = False
+
+    # ----- staging -----
+    def add(self, repo_path, local_path=None):
+        with open(local_path or repo_path, "rb") as f:
+            self.files[repo_path] = f.read()
+        self.deletions.discard(repo_path)
+
+    def delete(self, repo_path):
+        self.files.pop(repo_path, None)
+        self.deletions.add(repo_path)
+
+    def remote_paths(self, prefix):
+        """Percorsi remoti sotto prefix (dal tree in cache, aggiornato se il branch è avanzato)."""
+        if not self.token:
+            return []
+        try:
+            self._remote_tree()
+        except Exception as e:
+            log_error(f"Errore lettura tree GitHub: {e}")
+        return sorted(p for p in self._load_cache()["tree"] if p.startswith(prefix))
+
+    def remote_sha(self, repo_path):
+        """SHA del blob remoto di repo_path (None se non esiste o senza token)."""
+        if not self.token:
+            return None
+        return self._remote_tree().get(repo_path)
+
+    def fetch(self, repo_path):
+        """Contenuto remoto di repo_path (bytes, via git/blobs); None se non esiste o senza token."""
+        sha = self.remote_sha(repo_path)
+        if sha is None:
+            return None
+        r = self._api("GET", f"git/blobs/{sha}")
+        r.raise_for_status()
+        return base64.b64decode(r.json()["content"])
+
+    def _remote_tree(self):
+        """Tree remoto in cache, riallineato al branch una volta per Publisher."""
+        if not self._synced:
+            self._sync_head()
+            self._synced = True
+        return self._load_cache()["tree"]
+
+    # ----- cache SHA remoti -----
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                    self._cache = json.load(f)
+            except FileNotFoundError:
+                self._cache = {"head": None, "tree_sha": None, "tree": {}}
+            except Exception as e:
+                log_error(f"Cache publish GitHub illeggibile, la ricostruisco: {e}")
+                self._cache = {"head": None, "tree_sha": None, "tree": {}}
+        return self._cache
+
+    def _save_cache(self):
+        """
+        Salva la cache su disco. Un errore qui non fa fallire il publish (il commit può essere
+        già sul branch): la cache in memoria resta valida e il file si riallinea alla run dopo.
+        """
+        # tmp univoco per processo/thread: due worker non si sovrascrivono il file a metà
+        tmp = f"{CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with _cache_lock:
+            try:
+                os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._cache, f)
+                os.replace(tmp, CACHE_PATH)
+                return True
+            except Exception as e:
+                log_warning(f"Cache publish GitHub non salvata: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return False
+
+    def _pending(self):
+        tree = self._load_cache()["tree"]
+        changed = {p: c for p, c in self.files.items() if tree.get(p) != blob_sha(c)}
+        deleted = {p for p in self.deletions if p in tree}
+        return changed, deleted
+
+    # ----- API -----
+    def _api(self, method, path, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = get_session().request(
+                method, f"{API_URL}/repos/{REPO}/{path}",
+                headers={"Authorization": f"Bearer {self.token}", "Accept": "application/vnd.github+json"},
+                timeout=TIMEOUT, **kwargs,
+            )
+        except Exception:
+            observe_http(urlsplit(API_URL).netloc, "error", time.perf_counter() - t0)
+            raise
+        observe_http(urlsplit(API_URL).netloc, r.status_code, time.perf_counter() - t0)
+        return r
+
+    def _sync_head(self, force=False):
+        """Allinea la cache al commit di testa del branch (solo se è cambiato)."""
+        cache = self._load_cache()
+        r = self._api("GET", f"git/ref/heads/{BRANCH}")
+        r.raise_for_status()
+        head = r.json()["object"]["sha"]
+        if head == cache["head"] and cache["tree_sha"] and not force:
+            return head
+
+        r = self._api("GET", f"git/commits/{head}")
+        r.raise_for_status()
+        tree_sha = r.json()["tree"]["sha"]
+        r = self._api("GET", f"git/trees/{tree_sha}", params={"recursive": "1"})
+        r.raise_for_status()
+        cache["head"] = head
+        cache["tree_sha"] = tree_sha
+        cache["tree"] = {e["path"]: e["sha"] for e in r.json().get("tree", []) if e.get("type") == "blob"}
+        self._save_cache()
+        return head
+
+    def _tree_entry(self, path, content):
+        try:
+            return {"path": path, "mode": "100644", "type": "blob", "content": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            r = self._api("POST", "git/blobs", json={
+                "content": base64.b64encode(content).decode("ascii"), "encoding": "base64"
+            })
+            r.raise_for_status()
+            return {"path": path, "mode": "100644", "type": "blob", "sha": r.json()["sha"]}
+
+    def publish(self):
+        """Crea un solo commit con tutti i file cambiati e le cancellazioni. Ritorna True se ok."""
+        if not self.token:
+            log_info("GITHUB_TOKEN non impostato – commit saltato")
+            return False
+
+        changed, deleted = self._pending()
+        if not changed and not deleted and self._load_cache()["head"]:
+            log_info(f"GitHub: nessuna modifica ({len(self.files)} file invariati) – commit saltato")
+            return True
+
+        try:
+            for attempt in range(2):
+                head = self._sync_head(force=attempt > 0)
+                changed, deleted = self._pending()
+                if not changed and not deleted:
+                    log_info("GitHub: contenuti già aggiornati – commit saltato")
+                    return True
+
+                entries = [self._tree_entry(p, c) for p, c in changed.items()]
+                entries += [{"path": p, "mode": "100644", "type": "blob", "sha": None} for p in deleted]
+
+                r = self._api("POST", "git/trees", json={"base_tree": self._cache["tree_sha"], "tree": entries})
+                r.raise_for_status()
+                tree_sha = r.json()["sha"]
+
+                r = self._api("POST", "git/commits", json={"message": self.message, "tree": tree_sha, "parents": [head]})
+                r.raise_for_status()
+                commit_sha = r.json()["sha"]
+
+                r = self._api("PATCH", f"git/refs/heads/{BRANCH}", json={"sha": commit_sha})
+                if r.status_code == 422 and attempt == 0:
+                    # il branch è avanzato nel frattempo: ricalcolo sul nuovo head
+                    log_info("GitHub: branch avanzato durante il commit, ritento")
+                    continue
+                r.raise_for_status()
+
+                cache = self._cache
+                cache["head"], cache["tree_sha"] = commit_sha, tree_sha
+                for p, c in changed.items():
+                    cache["tree"][p] = blob_sha(c)
+                for p in deleted:
+                    cache["tree"].pop(p, None)
+                self._save_cache()
+
+                log_info(f"Commit GitHub OK: {len(changed)} file aggiornati, {len(deleted)} rimossi ({commit_sha[:7]})")
+                return True
+        except Exception as e:
+            log_error(f"Errore durante commit GitHub: {e}")
+        return False
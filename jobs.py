@@ -0,0 +1,118 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from utils.logger import log_info, log_error
+
+MAX_JOBS = 50  # job conservati in memoria (i più vecchi vengono scartati)
+
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+def _now_iso():
+    return datetime.now(ZoneInfo("Europe/Rome")).isoformat()
+
+
+# ---------------------------------------------------------
+# JOB
+# ---------------------------------------------------------
+class Job:
+    """Esecuzione in background di un aggiornamento, con avanzamento per fase."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = "queued"
+        self.stages = []
+        self.result = None
+        self.error = None
+        self.created_at = _now_iso()
+        self.started_at = None
+        self.finished_at = None
+        self._t0 = None
+
+    def stage(self, name, **info):
+        """Chiude la fase corrente e ne apre una nuova (usata come callback di progresso)."""
+        now = time.monotonic()
+        with _lock:
+            if self.stages and self.stages[-1]["status"] == "running":
+                current = self.stages[-1]
+                current["status"] = "done"
+                current["duration_s"] = round(now - current.pop("_t"), 3)
+            self.stages.append({"name": name, "status": "running", "started_at": _now_iso(), "_t": now, **info})
+
+    def _start(self):
+        with _lock:
+            self.status = "running"
+            self.started_at = _now_iso()
+
+    def _finish(self, status, result=None, error=None):
+        """Stato finale, risultato ed errore in un solo passaggio sotto _lock (lo stesso di submit)."""
+        now = time.monotonic()
+        with _lock:
+            if self.stages and self.stages[-1]["status"] == "running":
+                current = self.stages[-1]
+                current["status"] = "done" if status == "completed" else "error"
+                current["duration_s"] = round(now - current.pop("_t"), 3)
+            self.result = result
+            self.error = error
+            self.status = status
+            self.finished_at = _now_iso()
+
+    def to_dict(self):
+        with _lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "stages": [{k: v for k, v in s.items() if k != "_t"} for s in self.stages],
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+# ---------------------------------------------------------
+# REGISTRO
+# ---------------------------------------------------------
+def _run(job, fn):
+    job._start()
+    log_info("Job %s %s avviato", job.kind, job.id)
+    try:
+        result = fn(job.stage)
+    except Exception as e:
+        job._finish("error", error=f"{type(e).__name__}: {e}")
+        log_error("Job %s %s fallito - %s", job.kind, job.id, job.error)
+        return
+    job._finish("completed", result=result)
+    log_info("Job %s %s completato", job.kind, job.id)
+
+
+def submit(kind, fn):
+    """
+    Avvia fn(progress) in un thread e ritorna il Job.
+    Se un job dello stesso tipo è già in corso ritorna quello (niente esecuzioni doppie).
+    """
+    with _lock:
+        for job in reversed(_jobs.values()):
+            if job.kind == kind and job.status in ("queued", "running"):
+                return job
+
+        job = Job(kind)
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+
+    threading.Thread(target=_run, args=(job, fn), name=f"job-{kind}-{job.id}", daemon=True).start()
+    return job
+
+
+def get(job_id):
+    with _lock:
+        return _jobs.get(job_id)
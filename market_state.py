@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import brotli  # opzionale: senza, si pubblica solo la variante .gz
+except ImportError:
+    brotli = None
+
+from utils.metrics import SNAPSHOT_CACHE
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MARKET_PATH = os.path.join(BASE_DIR, "data", "market.json")
+
+STAT_INTERVAL = 1.0  # secondi minimi tra due stat() di market.json
+MAX_STREAMS = 8      # connessioni SSE contemporanee (ognuna occupa un thread gunicorn)
+
+
+# ---------------------------------------------------------
+# SNAPSHOT IN MEMORIA DI market.json
+# ---------------------------------------------------------
+class MarketSnapshot:
+    """Documento market.json già parsato, più il body serializzato dell'ultimo minuto."""
+
+    def __init__(self, key, doc, version):
+        self.key = key  # (path, st_ino, st_mtime_ns, st_size)
+        self.doc = doc
+        self.version = version  # hash del contenuto del file (id evento SSE)
+        self._rendered = None  # (minute, body, etag, {encoding: body compresso})
+
+    def render(self, minute, encoding=None):
+        """
+        Body JSON + ETag forte; datetime/datetime_readable al minuto (come mostrato dalle pagine).
+        Con encoding ("gzip"/"br") il body è compresso una sola volta per minuto e l'ETag
+        ha il suffisso della codifica.
+        """
+        rendered = self._rendered
+        if not rendered or rendered[0] != minute:
+            data = dict(self.doc)
+            data["datetime"] = minute.isoformat()
+            data["datetime_readable"] = minute.strftime("%H:%M %d-%m-%Y")
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            rendered = (minute, body, hashlib.blake2b(body, digest_size=8).hexdigest(), {})
+            self._rendered = rendered
+
+        _, body, etag, encoded = rendered
+        if encoding is None:
+            return body, etag
+        if encoding not in encoded:
+            encoded[encoding] = compress(body, encoding)
+        return encoded[encoding], f"{etag}-{encoding}"
+
+
+_snapshot = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (path, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def current_snapshot(path=None):
+    """
+    Snapshot corrente; rilegge il file solo se inode/mtime/size sono cambiati
+    (e al più un stat() ogni STAT_INTERVAL secondi). La cache è per percorso: un path
+    diverso da quello in cache (o MARKET_PATH cambiato) forza la rilettura.
+    Solleva FileNotFoundError se market.json non esiste, ValueError se non è JSON valido.
+    """
+    global _snapshot, _checked_at
+    path = os.path.abspath(path or MARKET_PATH)
+    now = time.monotonic()
+    snap = _snapshot
+    if snap is not None and snap.key[0] == path and now - _checked_at < STAT_INTERVAL:
+        SNAPSHOT_CACHE.inc(result="hit")
+        return snap
+
+    with _lock:
+        if _snapshot is not None and _snapshot.key[0] == path and now - _checked_at < STAT_INTERVAL:
+            SNAPSHOT_CACHE.inc(result="hit")
+            return _snapshot
+        key = _stat_key(path)
+        if _snapshot is None or _snapshot.key != key:
+            with open(path, "rb") as f:
+                raw = f.read()
+            doc = json.loads(raw.decode("utf-8"))
+            _snapshot = MarketSnapshot(key, doc, hashlib.blake2b(raw, digest_size=8).hexdigest())
+            SNAPSHOT_CACHE.inc(result="reload")
+        else:
+            SNAPSHOT_CACHE.inc(result="stat")
+        _checked_at = now
+        return _snapshot
+
+
+# ---------------------------------------------------------
+# SCRITTURA ATOMICA + VARIANTI PRECOMPRESSE
+# ---------------------------------------------------------
+# Suffisso del file -> Content-Encoding
+ENCODINGS = {".br": "br", ".gz": "gzip"}
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def _write_atomic(path, content):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def write_market(doc, path=None):
+    """
+    Scrive market.json compatto con rename atomico (i lettori vedono il file vecchio o
+    quello nuovo, mai uno a metà), più le varianti .gz/.br servite da /market.json.
+    Le varianti si scrivono prima del file principale; poi sveglia gli stream SSE.
+    """
+    path = path or MARKET_PATH
+    raw = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for suffix, encoding in ENCODINGS.items():
+        if encoding in supported_encodings():
+            _write_atomic(path + suffix, compress(raw, encoding))
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)  # niente varianti vecchie servite al posto di quella nuova
+    _write_atomic(path, raw)
+    publish()
+    return len(raw)
+
+
+def invalidate():
+    """Forza il ricontrollo del file alla prossima lettura (chiamata dopo ogni salvataggio)."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+# ---------------------------------------------------------
+# NOTIFICHE NUOVO SNAPSHOT (SSE)
+# ---------------------------------------------------------
+_generation = 0
+_cond = threading.Condition()
+_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def publish():
+    """Chiamata da save_market_json dopo la scrittura: sveglia gli stream in attesa."""
+    global _generation
+    invalidate()
+    with _cond:
+        _generation += 1
+        _cond.notify_all()
+
+
+def generation():
+    return _generation
+
+
+def wait_published(seen, timeout):
+    """Attende una publish() successiva alla generazione `seen` (o il timeout)."""
+    with _cond:
+        _cond.wait_for(lambda: _generation != seen, timeout)
+        return _generation
+
+
+def acquire_stream():
+    return _streams.acquire(blocking=False)
+
+
+def release_stream():
+    _streams.release()
+
+
+def stream_releaser():
+    """Rilascio dello slot da registrare con Response.call_on_close: idempotente (una sola release)."""
+    once = threading.Lock()
+
+    def release():
+        if once.acquire(blocking=False):
+            release_stream()
+    return release
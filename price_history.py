@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from utils.logger import log_info, log_error
+from utils.series_store import SeriesStore
+
+PAGE_SIZE = 1000  # limite righe per risposta PostgREST (max-rows di default su Supabase)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIRROR_DIR = os.path.join(BASE_DIR, "data", "history")
+SYNC_INTERVAL = 6 * 3600  # secondi tra due sync incrementali (le nostre scritture sono write-through)
+
+
+# ---------------------------------------------------------
+# INDICE STORICO IN MEMORIA
+# ---------------------------------------------------------
+class PriceHistory:
+    """
+    Storico chiusure per simbolo: date (ordinali) e prezzi ordinati per data.
+    Le ricerche "on or before" / "previous close" sono bisect locali.
+    """
+
+    def __init__(self):
+        self._dates = {}
+        self._prices = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        by_symbol = {}
+        for row in rows:
+            d = date.fromisoformat(str(row["snapshot_date"])[:10]).toordinal()
+            by_symbol.setdefault(row["symbol"], {})[d] = float(row["close_value"])
+
+        history = cls()
+        for symbol, points in by_symbol.items():
+            ordered = sorted(points.items())
+            history._dates[symbol] = [d for d, _ in ordered]
+            history._prices[symbol] = [p for _, p in ordered]
+        return history
+
+    @classmethod
+    def from_store(cls, store):
+        """Vista sulle colonne memory-mapped dello store, senza copie."""
+        history = cls()
+        for symbol in store.keys():
+            history._dates[symbol], history._prices[symbol] = store.columns(symbol)
+        return history
+
+    def symbols(self):
+        return list(self._dates)
+
+    def columns(self, symbol):
+        """(date ordinali, prezzi) del simbolo, ordinati per data."""
+        return self._dates.get(symbol, ()), self._prices.get(symbol, ())
+
+    def __len__(self):
+        return sum(len(d) for d in self._dates.values())
+
+    def on_or_before(self, symbol, target_date):
+        """Ultimo prezzo con snapshot_date <= target_date."""
+        dates = self._dates.get(symbol)
+        if not dates:
+            return None
+        i = bisect_right(dates, target_date.toordinal()) - 1
+        return self._prices[symbol][i] if i >= 0 else None
+
+    def previous_close(self, symbol, today_date):
+        """Ultimo prezzo con snapshot_date < today_date."""
+        dates = self._dates.get(symbol)
+        if not dates:
+            return None
+        i = bisect_left(dates, today_date.toordinal()) - 1
+        return self._prices[symbol][i] if i >= 0 else None
+
+
+# ---------------------------------------------------------
+# MIRROR LOCALE DI previous_close
+# ---------------------------------------------------------
+class HistoryMirror:
+    """
+    Copia locale di previous_close in data/history/ (colonne per simbolo, memory-mapped).
+    Sync incrementale per watermark sull'id (identity, cresce ad ogni INSERT: la tabella
+    in produzione non ha inserted_at, vedi i backup) più la ri-lettura dell'ultimo
+    snapshot_date (le UPSERT intraday aggiornano la riga senza cambiare id).
+    """
+
+    def __init__(self, folder=MIRROR_DIR):
+        self.folder = folder
+        self.store = SeriesStore(folder)
+        self.meta_path = os.path.join(folder, "meta.json")
+        self._lock = threading.Lock()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            log_error(f"Errore lettura meta mirror storico: {e}")
+            return {}
+
+    def _save_meta(self, meta):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = f"{self.meta_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def sync(self, supabase, force=False):
+        """Scarica solo le righe nuove/aggiornate dopo il watermark. Ritorna il numero di righe lette."""
+        with self._lock:
+            meta = self._load_meta()
+            if not force and time.time() - meta.get("synced_at", 0) < SYNC_INTERVAL:
+                return 0
+
+            watermark = meta.get("max_id")
+            last_date = meta.get("last_date")
+            rows = []
+            start = 0
+            while True:
+                query = (
+                    supabase.table("previous_close")
+                    .select("id,symbol,snapshot_date,close_value")
+                )
+                if watermark is not None and last_date:
+                    query = query.or_(f"id.gt.{watermark},snapshot_date.gte.{last_date}")
+                resp = query.order("id").range(start, start + PAGE_SIZE - 1).execute()
+                page = resp.data or []
+                rows.extend(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                start += PAGE_SIZE
+
+            by_symbol = {}
+            for row in rows:
+                d = date.fromisoformat(str(row["snapshot_date"])[:10]).toordinal()
+                by_symbol.setdefault(row["symbol"], {})[d] = float(row["close_value"])
+                if watermark is None or row["id"] > watermark:
+                    watermark = row["id"]
+                if not last_date or row["snapshot_date"] > last_date:
+                    last_date = row["snapshot_date"]
+
+            for symbol, points in by_symbol.items():
+                self.store.upsert(symbol, points)
+
+            self._save_meta({"max_id": watermark, "last_date": last_date, "synced_at": time.time()})
+            log_info(f"Mirror storico sincronizzato: {len(rows)} righe (watermark {watermark})")
+            return len(rows)
+
+    def record(self, symbol, snapshot_date, close_value):
+        """Write-through delle chiusure scritte da noi su Supabase."""
+        self.store.upsert(symbol, {snapshot_date.toordinal(): float(close_value)})
+
+    def history(self):
+        return PriceHistory.from_store(self.store)
+
+    def load(self, supabase):
+        """Sync incrementale (se dovuto) e vista locale; se Supabase non risponde usa i dati locali."""
+        try:
+            self.sync(supabase)
+        except Exception as e:
+            log_error(f"Sync mirror storico fallito, uso copia locale: {e}")
+        return self.history()
+
+
+_mirror = None
+
+
+def get_mirror():
+    global _mirror
+    if _mirror is None:
+        _mirror = HistoryMirror()
+    return _mirror
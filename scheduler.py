@@ -0,0 +1,290 @@
+import json
+import os
+import random
+import threading
+import uuid
+from datetime import datetime, time, timedelta
+
+import jobs
+from config import is_market_open
+from utils.logger import log_info, log_error
+from utils.singleflight import SingleFlight, get_flight
+from utils.trading_calendar import CLOSE_TIME, MARKET_TZ, is_trading_day
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(BASE_DIR, "data", "scheduler_state.json")
+STATE_FLIGHT = "scheduler_state"  # lock (tra processi) su scheduler_state.json
+
+# ---------------------------------------------------------
+# PARAMETRI SCHEDULER (da ambiente)
+# ---------------------------------------------------------
+REFRESH_MINUTES = float(os.environ.get("SCHEDULER_REFRESH_MINUTES", "10"))  # aggiornamenti a mercato aperto
+JITTER_SECONDS = float(os.environ.get("SCHEDULER_JITTER", "60"))            # +/- casuale su ogni intervallo
+TICK_SECONDS = 30                                                            # risveglio massimo del thread
+
+ONE_SHOT_TIME = time(7, 15)     # backup settimanale e report mensile (finestra storica 07:10-07:20)
+ALERT_TIME = time(19, 15)       # alert Alexa (check_alert accetta solo 19:10-19:20)
+CLOSE_RUN_DELAY = timedelta(minutes=5)
+
+
+def enabled():
+    """Scheduler interno attivo (SCHEDULER_ENABLED=1): backup, report e alert non dipendono più dal cron."""
+    return os.environ.get("SCHEDULER_ENABLED", "0") == "1"
+
+
+# ---------------------------------------------------------
+# ISTANTI PROGRAMMATI (ultimo slot <= now, ora di Roma)
+# ---------------------------------------------------------
+def _latest_daily(now, at, day_ok, max_days=40):
+    d = now.date()
+    for _ in range(max_days):
+        slot = datetime.combine(d, at, tzinfo=MARKET_TZ)
+        if slot <= now and day_ok(d):
+            return slot
+        d -= timedelta(days=1)
+    return None
+
+
+def report_day(d):
+    """Giorno del report mensile: il 1° se feriale, altrimenti il lunedì successivo (2 o 3)."""
+    return (d.day == 1 and d.weekday() < 5) or (d.weekday() == 0 and d.day in (2, 3))
+
+
+def backup_slot(now):
+    return _latest_daily(now, ONE_SHOT_TIME, lambda d: d.weekday() == 0)
+
+
+def report_slot(now):
+    return _latest_daily(now, ONE_SHOT_TIME, report_day)
+
+
+def alert_slot(now):
+    return _latest_daily(now, ALERT_TIME, lambda d: d.weekday() < 5)
+
+
+def close_slot(now):
+    """Run dopo la chiusura di ogni seduta: market.json passa a CHIUSO con l'ultimo prezzo."""
+    at = (datetime.combine(now.date(), CLOSE_TIME) + CLOSE_RUN_DELAY).time()
+    return _latest_daily(now, at, is_trading_day)
+
+
+class OneShot:
+    """
+    Esecuzione unica per slot; se lo slot è stato perso si recupera entro `grace`.
+    kind: tipo di job in jobs.submit (default = name), condiviso con gli endpoint.
+    """
+
+    def __init__(self, name, slot, grace, run, kind=None):
+        self.name = name
+        self.slot = slot
+        self.grace = grace
+        self.run = run
+        self.kind = kind or name
+
+
+# ---------------------------------------------------------
+# SCHEDULER
+# ---------------------------------------------------------
+class Scheduler:
+    """
+    Un thread che si sveglia ogni TICK_SECONDS (o prima, al prossimo evento) e:
+    - a mercato aperto avvia un aggiornamento ogni REFRESH_MINUTES +/- jitter, a mercato chiuso nessuno;
+    - lancia i one-shot (backup, report, alert, run di chiusura) una sola volta per slot,
+      recuperando quelli persi (es. macchina sospesa) entro la loro tolleranza.
+    Tutto passa da jobs.submit: un trigger mentre lo stesso job è in corso si aggancia a quello.
+    Lo stato (ultimi slot eseguiti, prossimo refresh) è in data/scheduler_state.json.
+
+    Più processi possono avere uno scheduler attivo (worker gunicorn, macchina sovrapposta
+    durante un deploy, script che importano app): ogni slot one-shot si prenota nel file di
+    stato sotto il lock STATE_FLIGHT (lo prende un solo processo) e l'esecuzione gira sotto
+    il single-flight del task.
+    """
+
+    def __init__(self, update_etf, tasks, state_path=STATE_PATH, refresh_minutes=REFRESH_MINUTES,
+                 jitter=JITTER_SECONDS, submit=None, rng=None, lock_dir=None):
+        self.update_etf = update_etf
+        self.tasks = tasks
+        self.state_path = state_path
+        self.interval = timedelta(minutes=refresh_minutes)
+        self.jitter = jitter
+        self.submit = submit or jobs.submit
+        self.rng = rng or random.Random()
+        self.lock_dir = lock_dir
+        self.state = self._load_state()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ----- stato -----
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except Exception as e:
+            log_error(f"Stato scheduler illeggibile, riparto da zero: {e}")
+            state = {}
+        state.setdefault("last", {})
+        state.setdefault("refresh_at", None)
+        return state
+
+    def _flight(self, name):
+        return SingleFlight(name, folder=self.lock_dir) if self.lock_dir else get_flight(name)
+
+    def _locked(self, fn, *args):
+        """fn(*args) sotto il lock del file di stato (chiave unica: nessun aggancio al risultato altrui)."""
+        return self._flight(STATE_FLIGHT).run(fn, *args, key=uuid.uuid4().hex)
+
+    def _merge_file(self):
+        """Fonde in memoria gli slot registrati su file da altri processi (vince il più recente)."""
+        for name, done in self._load_state()["last"].items():
+            mine = self.state["last"].get(name)
+            if not mine or datetime.fromisoformat(done) > datetime.fromisoformat(mine):
+                self.state["last"][name] = done
+
+    def _write_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f"{self.state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def _save_state(self):
+        def save():
+            self._merge_file()
+            self._write_state()
+        self._locked(save)
+
+    def _claim(self, name, slot):
+        """Registra lo slot su file se nessun processo l'ha già fatto. True = tocca a noi."""
+        def claim():
+            self._merge_file()
+            done = self.state["last"].get(name)
+            if done and datetime.fromisoformat(done) >= slot:
+                return False
+            self.state["last"][name] = slot.isoformat()
+            self._write_state()
+            return True
+        return self._locked(claim)
+
+    def _guarded(self, task, slot):
+        """Runner del job: il one-shot gira sotto il single-flight del task (stesso slot = una run)."""
+        def run(progress=None):
+            return self._flight(task.name).run(task.run, progress, key=slot.isoformat())
+        return run
+
+    # ----- logica -----
+    def _next_refresh(self, now):
+        offset = self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0
+        return now + self.interval + timedelta(seconds=offset)
+
+    def tick(self, now=None):
+        """Esegue ciò che è dovuto all'istante now. Ritorna i nomi dei trigger lanciati."""
+        now = datetime.now(MARKET_TZ) if now is None else now.astimezone(MARKET_TZ)
+        fired, changed = [], False
+
+        for task in self.tasks:
+            slot = task.slot(now)
+            if slot is None:
+                continue
+            done = self.state["last"].get(task.name)
+            if done and datetime.fromisoformat(done) >= slot:
+                continue
+            if not self._claim(task.name, slot):
+                # slot già preso da un altro processo
+                continue
+            if now - slot > task.grace:
+                # slot perso oltre la tolleranza (o precedente al primo avvio): si salta
+                if done:
+                    log_error(f"Scheduler: {task.name} del {slot:%d/%m %H:%M} perso (fuori tolleranza)")
+            else:
+                job = self.submit(task.kind, self._guarded(task, slot))
+                log_info(f"Scheduler: {task.name} slot {slot:%d/%m %H:%M} -> job {job.id} ({job.status})")
+                fired.append(task.name)
+
+        refresh_at = self.state.get("refresh_at")
+        if is_market_open(now) and (not refresh_at or now >= datetime.fromisoformat(refresh_at)):
+            job = self.submit("update-all", self.update_etf)
+            log_info(f"Scheduler: aggiornamento ETF -> job {job.id} ({job.status})")
+            self.state["refresh_at"] = self._next_refresh(now).isoformat()
+            fired.append("update-all")
+            changed = True
+
+        if changed:
+            self._save_state()
+        return fired
+
+    def sleep_seconds(self, now):
+        refresh_at = self.state.get("refresh_at")
+        if refresh_at and is_market_open(now):
+            wait = (datetime.fromisoformat(refresh_at) - now).total_seconds()
+            return max(1.0, min(TICK_SECONDS, wait))
+        return TICK_SECONDS
+
+    # ----- thread -----
+    def _loop(self):
+        log_info(f"Scheduler avviato (refresh {self.interval.total_seconds() / 60:g} min, jitter {self.jitter:g}s)")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                log_error(f"Errore scheduler: {e}", exc_info=True)
+            self._stop.wait(self.sleep_seconds(datetime.now(MARKET_TZ)))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def to_dict(self):
+        return {"enabled": True, "refresh_minutes": self.interval.total_seconds() / 60,
+                "jitter_s": self.jitter, **self.state}
+
+
+# ---------------------------------------------------------
+# JOB ONE-SHOT
+# ---------------------------------------------------------
+def _run_backup(progress=None):
+    import scraper_etf
+    from github_publisher import Publisher
+    publisher = Publisher()
+    staged = scraper_etf.run_backup(publisher)
+    return {"backup": staged, "published": publisher.publish() if staged else False}
+
+
+def _run_report(progress=None):
+    import scraper_etf
+    return {"report": scraper_etf.send_report()}
+
+
+def _run_alert(progress=None):
+    import check_alert
+    return {"alert": check_alert.check_alert()}
+
+
+def default_tasks(update_etf):
+    return [
+        OneShot("backup", backup_slot, timedelta(hours=12), _run_backup),
+        OneShot("report", report_slot, timedelta(hours=12), _run_report),
+        OneShot("alert", alert_slot, timedelta(minutes=5), _run_alert),
+        OneShot("close", close_slot, timedelta(hours=2), update_etf, kind="update-all"),
+    ]
+
+
+_scheduler = None
+
+
+def start(update_etf):
+    """Avvia lo scheduler del processo (una volta sola). update_etf: runner dei job update-all."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler(update_etf, default_tasks(update_etf)).start()
+    return _scheduler
+
+
+def status():
+    return _scheduler.to_dict() if _scheduler else {"enabled": False}
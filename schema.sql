@@ -5,10 +5,12 @@ create table if not exists previous_close (
   close_value numeric not null,        -- valore di chiusura
   snapshot_date date not null,         -- SOLO la data (YYYY-MM-DD)
   label text,                          -- nome leggibile dell'ETF
+  daily_change numeric,                -- variazione % rispetto alla chiusura precedente
   inserted_at timestamptz default now()
 );
 
 -- Vincolo di unicità: un solo record per simbolo e giorno
+-- (usato anche come target ON CONFLICT dell'UPSERT batch in supabase_client.py)
 create unique index if not exists unique_symbol_date
   on previous_close(symbol, snapshot_date);
 
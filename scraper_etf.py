@@ -1,33 +1,25 @@
 import os
 import json
-import base64
-import requests
-from bs4 import BeautifulSoup
-from datetime import date, timedelta, datetime
+from datetime import date, datetime
 from zoneinfo import ZoneInfo
 
 import check_alert
+import scheduler
+import market_state
 import backup_manager
 import bot_telegram
-from supabase_client import get_supabase, upsert_previous_close
+from github_publisher import Publisher
+from supabase_client import get_supabase, close_row, upsert_previous_closes
+from price_history import get_mirror
+from variations import DEFAULT_CODES, compute_variations, variations_by_code, format_configured
 from config import is_market_open
+from utils.extract import ls_tc_mid
+from utils.fetcher import fetch, fetch_all
 from utils.logger import log_info, log_error
+from utils.metrics import SCRAPES, StageTimer
+from utils.singleflight import get_flight
 
-HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-
-# ---------------------------------------------------------
-# PERIODI MULTI-VARIAZIONE
-# ---------------------------------------------------------
-PERIODS = {
-    "D":  (1,      "D"),
-    "W":  (7,      "W"),
-    "M":  (30,     "M"),
-    "Q":  (90,     "Q"),
-    "H":  (180,    "H"),
-    "Y":  (365,    "Y"),
-    "3":  (365*3,  "3Y"),
-    "5":  (365*5,  "5Y"),
-}
+LS_TC_URL = "https://www.ls-tc.de/de/etf/{item_id}"
 
 # ---------------------------------------------------------
 # CARICAMENTO ETF
@@ -77,86 +69,47 @@ def load_variation_config():
 # ---------------------------------------------------------
 # SCRAPING PREZZO
 # ---------------------------------------------------------
+def parse_price(html, item_id):
+    mid = ls_tc_mid(html, item_id)
+    if mid:
+        return float(mid.replace(",", "."))
+    log_error("Prezzo non trovato per item_id %s", item_id)
+    return None
+
 def scrape_price(item_id):
-    url = f"https://www.ls-tc.de/de/etf/{item_id}"
+    r = fetch(LS_TC_URL.format(item_id=item_id))
+    if r is None:
+        return None
     try:
-        r = requests.get(url, headers=HEADERS, timeout=20)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        mid = soup.find("span", attrs={"field": "mid", "item": f"{item_id}@1"})
-        if mid and mid.text.strip():
-            return float(mid.text.strip().replace(",", "."))
-        log_error(f"Prezzo non trovato per item_id {item_id}")
+        return parse_price(r.text, item_id)
     except Exception as e:
-        log_error(f"Errore scraping {item_id}: {e}")
+        log_error("Errore scraping %s: %s", item_id, e)
     return None
 
+def scrape_prices(item_ids):
+    """Scraping parallelo di tutti gli item_id; ritorna i prezzi nello stesso ordine (None se mancante)."""
+    urls = [LS_TC_URL.format(item_id=item_id) for item_id in item_ids]
+    by_url = dict(zip(urls, item_ids))
+    return fetch_all(urls, parse=lambda url, r: parse_price(r.text, by_url[url]))
+
 # ---------------------------------------------------------
 # PREVIOUS CLOSE & VARIAZIONI
 # ---------------------------------------------------------
-def get_previous_close(symbol, supabase):
-    today = date.today().isoformat()
-    try:
-        resp = (
-            supabase.table("previous_close")
-            .select("close_value")
-            .eq("symbol", symbol)
-            .filter("snapshot_date", "lt", today)
-            .order("snapshot_date", desc=True)
-            .limit(1)
-            .execute()
-        )
-        if resp.data:
-            return resp.data[0]["close_value"]
-    except Exception as e:
-        log_error(f"Errore query previous_close {symbol}: {e}")
-    return None
-
-def get_price_on_or_before(symbol, target_date, supabase):
-    try:
-        target_str = target_date.isoformat()
-        resp = (
-            supabase.table("previous_close")
-            .select("close_value")
-            .eq("symbol", symbol)
-            .filter("snapshot_date", "lte", target_str)
-            .order("snapshot_date", desc=True)
-            .limit(1)
-            .execute()
-        )
-        if resp.data:
-            return float(resp.data[0]["close_value"])
-    except Exception as e:
-        log_error(f"Errore get_price_on_or_before({symbol}, {target_date}): {e}")
-    return None
+def get_previous_close(symbol, history, today_date=None):
+    return history.previous_close(symbol, today_date or date.today())
 
 def calc_variation(price_today, price_past):
     if price_today is None or price_past is None or price_past == 0:
         return None
     return ((price_today - price_past) / price_past) * 100.0
 
-def fmt_variation(value, suffix):
-    if value is None:
-        return "N/A"
-    sign = "+" if value >= 0 else ""
-    return f"{sign}{value:.2f}%{suffix}"
-
-def compute_all_variations(symbol, price_today, today_date, supabase):
-    results = {}
-    for code, (days, suffix) in PERIODS.items():
-        target_date = today_date - timedelta(days=days)
-        past_price = get_price_on_or_before(symbol, target_date, supabase)
-        variation = calc_variation(price_today, past_price)
-        results[code] = fmt_variation(variation, suffix)
-    return results
-
 # ---------------------------------------------------------
 # SALVATAGGIO market.json
 # ---------------------------------------------------------
-def save_market_json(results, market_open):
+def save_market_json(results, market_open, variation_config=None):
     try:
-        os.makedirs("data", exist_ok=True)
-        path = os.path.join("data", "market.json")
+        if variation_config is None:
+            variation_config = load_variation_config()
 
         now = datetime.now(ZoneInfo("Europe/Rome"))
         readable = now.strftime("%H:%M %d-%m-%Y")
@@ -178,9 +131,14 @@ def save_market_json(results, market_open):
                 "value": round(etf["price"], 4),
             }
 
-            for key in ("v1", "v2", "v3", "v_led", "v_alert", "v_bot"):
-                if key in etf:
-                    entry[key] = etf[key]
+            variations = etf.get("variations", {})
+            entry.update(format_configured(variations, variation_config))
+            # Valori grezzi dei periodi in uso (check_alert e bot_telegram non ri-parsano le stringhe)
+            used = {variation_config.get(key, code) for key, code in DEFAULT_CODES.items()}
+            entry["variations"] = {
+                code: (round(v, 4) if v is not None else None)
+                for code, v in variations.items() if code in used
+            }
 
             data_array.append(entry)
 
@@ -194,67 +152,35 @@ def save_market_json(results, market_open):
             }
         }
 
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(json_output, f, indent=2, ensure_ascii=False)
+        # Scrittura atomica e compatta (+ varianti .gz/.br); notifica gli stream SSE
+        size = market_state.write_market(json_output)
 
-        log_info(f"market.json salvato con {len(data_array)} ETF")
+        log_info(f"market.json salvato con {len(data_array)} ETF ({size} byte)")
 
     except Exception as e:
         log_error(f"Errore salvataggio market.json: {e}")
 
-# ---------------------------------------------------------
-# COMMIT GITHUB
-# ---------------------------------------------------------
-def commit_to_github():
-    path = "data/market.json"
-    try:
-        token = os.environ.get("GITHUB_TOKEN")
-        if not token:
-            log_error("GITHUB_TOKEN non impostato – commit GitHub saltato")
-            return
-
-        repo = "Marchino1978/portfolio"
-        api_url = f"https://api.github.com/repos/{repo}/contents/{path}"
-
-        with open(path, "rb") as f:
-            content = base64.b64encode(f.read()).decode("utf-8")
-
-        sha = None
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/vnd.github+json"
-        }
-        get_resp = requests.get(api_url, headers=headers, timeout=10)
-        if get_resp.status_code == 200:
-            sha = get_resp.json().get("sha")
-
-        payload = {
-            "message": "fix",
-            "content": content,
-            "branch": "main"
-        }
-        if sha:
-            payload["sha"] = sha
-
-        put_resp = requests.put(api_url, headers=headers, json=payload, timeout=10)
-        if put_resp.status_code in (200, 201):
-            log_info("Commit market.json su GitHub completato")
-        else:
-            log_error(f"Errore commit GitHub: {put_resp.status_code} – {put_resp.text}")
-
-    except Exception as e:
-        log_error(f"Errore durante commit GitHub: {e}")
-
 # ---------------------------------------------------------
 # FUNZIONE PRINCIPALE
 # ---------------------------------------------------------
-def update_all_etf():
+def update_all_etf(progress=None):
+    """
+    progress: callback opzionale progress(nome_fase), usata dai job in background.
+    Una sola run alla volta tra thread e worker: chi arriva durante una run ne riceve il risultato.
+    """
+    # Ogni fase è misurata (portfolio_stage_seconds su /metrics) e inoltrata al job
+    with StageTimer("update_all_etf", progress) as stage:
+        results, market_open = get_flight("update_all_etf").run(
+            _update_all_etf, stage, on_wait=lambda: stage("attesa_run_in_corso")
+        )
+        return results, market_open
+
+def _update_all_etf(stage):
     log_info("=== INIZIO aggiornamento ETF ===")
     today_date = date.today()
     today_str = today_date.isoformat()
     market_open = is_market_open()
 
-    supabase = get_supabase()
     ETFS = load_etfs()
     if not ETFS:
         log_error("Nessun ETF caricato – aggiornamento interrotto")
@@ -262,33 +188,48 @@ def update_all_etf():
 
     variation_config = load_variation_config()
 
+    # Mercato chiuso: i prezzi non cambiano fino alla prossima seduta
+    if not market_open:
+        results = _closed_market(stage, today_date, ETFS, variation_config)
+        if results is not None:
+            return results, market_open
+
+    supabase = get_supabase()
+
+    # Storico dal mirror locale (sync incrementale): nessuna query per simbolo/periodo
+    stage("history")
+    mirror = get_mirror()
+    history = mirror.load(supabase)
+
     results = {}
 
-    for etf in ETFS:
+    stage("scrape")
+    log_info(f"Scraping parallelo di {len(ETFS)} ETF")
+    prices = scrape_prices([etf["item_id"] for etf in ETFS])
+
+    stage("variations")
+    available = [(etf, price) for etf, price in zip(ETFS, prices) if price is not None]
+    matrix = compute_variations(
+        history, [etf["symbol"] for etf, _ in available], [price for _, price in available], today_date
+    )
+    raw_variations = {etf["symbol"]: variations_by_code(row) for (etf, _), row in zip(available, matrix)}
+
+    closes = []
+    for etf, price in zip(ETFS, prices):
         symbol = etf["symbol"]
         label = etf["label"]
-        item_id = etf["item_id"]
-
-        log_info(f"Scraping {symbol} ({label}) – item_id {item_id}")
-        price = scrape_price(item_id)
 
         if price is None:
+            SCRAPES.inc(source="etf", symbol=symbol, result="fail")
             results[symbol] = {"status": "unavailable", "symbol": symbol, "label": label}
             continue
+        SCRAPES.inc(source="etf", symbol=symbol, result="ok")
 
-        prev = get_previous_close(symbol, supabase)
+        prev = get_previous_close(symbol, history, today_date)
         daily_change = calc_variation(price, prev) if prev else None
 
         if market_open:
-            upsert_previous_close(
-                symbol=symbol,
-                label=label,
-                close_value=price,
-                snapshot_date=today_str,
-                daily_change=daily_change
-            )
-
-        all_variations = compute_all_variations(symbol, price, today_date, supabase)
+            closes.append(close_row(symbol, label, price, today_str, daily_change))
 
         results[symbol] = {
             "symbol": symbol,
@@ -298,63 +239,151 @@ def update_all_etf():
             "daily_change": daily_change,
             "snapshot_date": today_str,
             "status": "open" if market_open else "closed",
-            "v1": all_variations.get(variation_config.get("v1", "D"), "N/A"),
-            "v2": all_variations.get(variation_config.get("v2", "W"), "N/A"),
-            "v3": all_variations.get(variation_config.get("v3", "M"), "N/A"),
-            "v_led": all_variations.get(variation_config.get("v_led", "M"), "N/A"),
-            "v_alert": all_variations.get(variation_config.get("v_alert", "M"), "N/A"),
-            "v_bot": all_variations.get(variation_config.get("v_bot", "M"), "N/A"),
+            "variations": raw_variations[symbol],
         }
 
-    save_market_json(results, market_open)
-    commit_to_github()
+    # Chiusure di tutta la run in una sola UPSERT
+    if closes:
+        stage("upsert")
+        try:
+            upsert_previous_closes(closes, supabase)
+            for row in closes:
+                mirror.record(row["symbol"], today_date, row["close_value"])
+            log_info(f"UPSERT previous_close: {len(closes)} chiusure")
+        except Exception as e:
+            log_error(f"Errore UPSERT previous_close: {e}")
 
+    _finish_run(stage, results, market_open, variation_config)
+    return results, market_open
+
+def _finish_run(stage, results, market_open, variation_config, save=True):
+    if save:
+        stage("save")
+        save_market_json(results, market_open, variation_config)
+    # Tutti i file della run (market.json, backup, rotazione) vanno in un solo commit finale
+    publisher = Publisher()
+    publisher.add("data/market.json")
+
+    # Con lo scheduler interno attivo alert, backup e report sono one-shot suoi (scheduler.py)
+    if not scheduler.enabled():
+        _window_tasks(stage, publisher)
+
+    # File invariati = nessuna richiesta a GitHub
+    stage("github")
+    publisher.publish()
+
+    log_info(f"=== FINE aggiornamento ETF – {len([r for r in results.values() if r.get('status') != 'unavailable'])} ETF aggiornati ===")
+
+# ---------------------------------------------------------
+# MERCATO CHIUSO (nessuno scraping)
+# ---------------------------------------------------------
+def _closed_market(stage, today_date, etfs, variation_config):
+    """
+    A mercato chiuso riusa i prezzi dell'ultimo market.json già CHIUSO:
+    - stesso giorno: nulla da rifare (nessun I/O di rete);
+    - giorno cambiato: ricalcola variazioni e chiusura precedente dal mirror locale
+      (nessuna query a Supabase se il mirror ha dati) e riscrive market.json.
+    Ritorna None se serve la run completa: primo giro dopo la chiusura (cattura l'ultimo
+    prezzo), snapshot mancante o elenco ETF cambiato.
+    """
+    try:
+        doc = market_state.current_snapshot().doc
+        entries = {e["symbol"]: e for e in doc["values"]["data"]}
+        snapshot_day = date.fromisoformat(doc["last_updated"]["iso"][:10])
+    except Exception as e:
+        log_info(f"Mercato chiuso ma snapshot non riusabile ({type(e).__name__}) – run completa")
+        return None
+    if doc.get("open") is not False:
+        log_info("Primo aggiornamento dopo la chiusura – run completa")
+        return None
+    if set(entries) != {etf["symbol"] for etf in etfs}:
+        log_info("Mercato chiuso ma elenco ETF cambiato – run completa")
+        return None
+
+    stage("closed")
+    prices = [float(entries[etf["symbol"]]["price"]) for etf in etfs]
+    same_day = snapshot_day == today_date
+    mirror = get_mirror()
+    history = mirror.history()
+    if same_day:
+        log_info(f"Mercato chiuso: snapshot del {snapshot_day} ancora valido, scraping saltato")
+    else:
+        log_info(f"Mercato chiuso: nuovo giorno ({snapshot_day} -> {today_date}), ricalcolo variazioni dal mirror")
+        if not len(history):
+            history = mirror.load(get_supabase())
+        matrix = compute_variations(history, [etf["symbol"] for etf in etfs], prices, today_date)
+
+    results = {}
+    for i, (etf, price) in enumerate(zip(etfs, prices)):
+        symbol = etf["symbol"]
+        prev = get_previous_close(symbol, history, today_date)
+        daily_change = calc_variation(price, prev) if prev else None
+        if same_day:
+            variations = entries[symbol].get("variations", {})
+        else:
+            variations = variations_by_code(matrix[i])
+        results[symbol] = {
+            "symbol": symbol,
+            "label": etf["label"],
+            "price": price,
+            "previous_close": prev,
+            "daily_change": daily_change,
+            "snapshot_date": today_date.isoformat(),
+            "status": "closed",
+            "variations": variations,
+        }
+
+    _finish_run(stage, results, False, variation_config, save=not same_day)
+    return results
+
+# ---------------------------------------------------------
+# BACKUP SUPABASE (settimanale) + REPORT TELEGRAM (mensile)
+# ---------------------------------------------------------
+def run_backup(publisher):
+    """Backup Supabase; se riuscito aggiunge catena e manifest al commit di publisher. Ritorna True se staged."""
+    try:
+        path_sql = backup_manager.run_supabase_backup()
+        if path_sql:
+            # Se il backup è riuscito, aggiungi catena e manifest al commit della run (rotazione per catene)
+            backup_manager.stage_backup(publisher, path_sql)
+            return True
+    except Exception as e:
+        log_error(f"Errore esecuzione backup/upload settimanale: {e}")
+    return False
+
+def send_report():
+    try:
+        bot_telegram.send_monthly_report()
+        log_info("Report Telegram inviato con successo.")
+        return True
+    except Exception as e:
+        log_error(f"Errore invio Telegram: {e}")
+        return False
+
+def _window_tasks(stage, publisher):
+    """Alert, backup e report legati all'orario della run (cron esterno, scheduler spento)."""
     # ---------------------------------------------------------
     # ALERT su AMAZON ALEXA
     # ---------------------------------------------------------
+    stage("alert")
     try:
         check_alert.check_alert()
         log_info("Controllo alert Alexa eseguito.")
     except Exception as e:
         log_error(f"Errore controllo alert Alexa: {e}")
 
-    # ---------------------------------------------------------
-    # BACKUP SUPABASE (settimanale) + REPORT TELEGRAM (mensile)
-    # ---------------------------------------------------------
     now_rome = datetime.now(ZoneInfo("Europe/Rome"))
     giorno_settimana = now_rome.weekday() # 0=Lunedì, 6=Domenica
 
     # 1. BACKUP SUPABASE (settimanale)
     if giorno_settimana == 0 and 10 <= now_rome.minute <= 20 and now_rome.hour == 7:
+        stage("backup")
         log_info(f"Avvio backup settimanale ({now_rome.day}/{now_rome.month})...")
-        try:
-            path_sql = backup_manager.run_supabase_backup()
-            if path_sql:
-                # Se il backup è riuscito, caricalo su GitHub (gestisce la rotazione a 3 file)
-                backup_manager.upload_backup_to_github(path_sql)
-        except Exception as e:
-            log_error(f"Errore esecuzione backup/upload settimanale: {e}")
-
-    # 2. REPORT TELEGRAM (mensile)
-    invia_oggi = False
-
-    # CASO 1: Oggi è il 1° del mese ed è un giorno lavorativo (Lun-Ven)
-    if now_rome.day == 1 and giorno_settimana < 5:
-        invia_oggi = True
-
-    # CASO 2: Il 1° era Sabato o Domenica e oggi è Lunedì (2 o 3 del mese)
-    elif giorno_settimana == 0 and (now_rome.day == 2 or now_rome.day == 3):
-        invia_oggi = True
+        run_backup(publisher)
 
+    # 2. REPORT TELEGRAM (mensile): il 1° se feriale, altrimenti il lunedì 2 o 3
     # Esegui l'invio solo nella finestra oraria del primo cron (07:10 - 07:20)
-    if invia_oggi and 10 <= now_rome.minute <= 20 and now_rome.hour == 7:
+    if scheduler.report_day(now_rome.date()) and 10 <= now_rome.minute <= 20 and now_rome.hour == 7:
+        stage("telegram")
         log_info(f"Condizione report mensile soddisfatta ({now_rome.day}/{now_rome.month}). Invio...")
-        try:
-            # import bot_telegram
-            bot_telegram.send_monthly_report()
-            log_info("Report Telegram inviato con successo.")
-        except Exception as e:
-            log_error(f"Errore invio Telegram: {e}")
-
-    log_info(f"=== FINE aggiornamento ETF – {len([r for r in results.values() if r.get('status') != 'unavailable'])} ETF aggiornati ===")
-    return results, market_open
\ No newline at end of file
+        send_report()
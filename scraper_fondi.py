@@ -1,17 +1,18 @@
 import csv
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
-import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import os
+import threading
 from io import StringIO
-import base64
 
-from utils.logger import log_info, log_error
-
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-}
+import fondi_history
+from github_publisher import Publisher
+from utils.extract import eurizon_nav, teleborsa_price
+from utils.http_cache import get_cache
+from utils.logger import log_debug, log_info, log_error
+from utils.metrics import SCRAPES, StageTimer
+from utils.singleflight import get_flight
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -21,33 +22,25 @@ fondi_nav_path = os.path.join(DATA_DIR, "fondi_nav.csv")
 # -----------------------------
 # Fetch & Parser
 # -----------------------------
-def fetch_html(url):
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        return r.text
-    except Exception as e:
-        log_error(f"Errore fetch {url}: {e}")
-        return None
-
 def parse_eurizon(html):
-    soup = BeautifulSoup(html, "html.parser")
-    span = soup.find("span", class_="product-dashboard-token-value-bold")
-    if span and span.get_text(strip=True):
-        return span.get_text(strip=True)
-    match = re.search(r"\d{1,3}(\.\d{3})*,\d{2}", soup.get_text())
-    return match.group(0) if match else None
+    return eurizon_nav(html)
 
 def parse_teleborsa(html):
-    soup = BeautifulSoup(html, "html.parser")
-    price_span = soup.find("span", id="ctl00_phContents_ctlHeader_lblPrice")
-    if price_span and price_span.get_text(strip=True):
-        return price_span.get_text(strip=True)
-    alt = soup.find("span", id=re.compile(r"lblPrice", re.I))
-    if alt and alt.get_text(strip=True):
-        return alt.get_text(strip=True)
-    match = re.search(r"\d{1,3}(\.\d{3})*,\d{2}", soup.get_text())
-    return match.group(0) if match else None
+    return teleborsa_price(html)
+
+def parser_for(url):
+    if "eurizoncapital.com" in url:
+        return parse_eurizon
+    if "teleborsa.it" in url:
+        return parse_teleborsa
+    return None
+
+def fetch_nav(url):
+    """NAV (testo) della pagina, via cache HTTP condizionale: pagina invariata = 304, niente parsing."""
+    parse = parser_for(url)
+    if parse is None:
+        return None
+    return get_cache().get(url, parse)
 
 def normalize(value_it):
     if not value_it:
@@ -56,43 +49,107 @@ def normalize(value_it):
     return s
 
 # -----------------------------
-# Commit GitHub
+# Stato per ISIN (fondi_nav.csv)
 # -----------------------------
-def commit_csv_to_github(path, message):
+NAV_FIELDS = ["timestamp", "nome", "ISIN", "nav_text_it", "nav_float", "last_success", "status"]
+MAX_WORKERS = 8
+# Età massima dell'ultimo controllo riuscito: oltre, il fondo si ricontrolla (la cache HTTP
+# rende economico il ricontrollo di una pagina invariata: 304, niente parsing)
+NAV_MAX_AGE = timedelta(minutes=float(os.environ.get("FONDI_MAX_AGE_MINUTES", "60")))
+
+_nav_lock = threading.Lock()
+
+def load_fondi():
+    with open(fondi_path, newline="", encoding="utf-8") as f:
+        lines = [line for line in f if line.strip() and not line.strip().startswith("#")]
+
+    clean_csv = StringIO("".join(lines))
+    reader = csv.DictReader(clean_csv)
+    reader.fieldnames = [fn.strip().lstrip("\ufeff") for fn in reader.fieldnames]
+
+    return [row for row in reader if any(row.values())]
+
+def load_nav_state():
+    """ISIN -> ultima riga di fondi_nav.csv (i file vecchi senza last_success/status sono accettati)."""
+    if not os.path.exists(fondi_nav_path):
+        return {}
+    with open(fondi_nav_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f, delimiter=";"))
+    state = {}
+    for row in rows:
+        if row.get("last_success") is None:
+            ok = row.get("nav_float") not in (None, "", "N/D")
+            row["last_success"] = row["timestamp"] if ok else ""
+            row["status"] = "OK" if ok else "ERR"
+        state[row["ISIN"]] = row
+    return state
+
+def is_stale(row, now, max_age=NAV_MAX_AGE):
+    """Da aggiornare: mai riuscito, ultimo tentativo fallito o ultimo successo più vecchio di max_age."""
+    if row is None or row.get("status") != "OK":
+        return True
     try:
-        token = os.environ.get("GITHUB_TOKEN")
-        if not token:
-            log_info("GITHUB_TOKEN non impostato – commit saltato")
-            return
-
-        repo = "Marchino1978/portfolio"
-        api_url = f"https://api.github.com/repos/{repo}/contents/{path}"
-
-        with open(path, "rb") as f:
-            content = base64.b64encode(f.read()).decode()
-
-        sha = None
-        headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-        resp = requests.get(api_url, headers=headers, timeout=10)
-        if resp.status_code == 200:
-            sha = resp.json().get("sha")
-
-        payload = {"message": message, "content": content, "branch": "main"}
-        if sha:
-            payload["sha"] = sha
-
-        put_resp = requests.put(api_url, headers=headers, json=payload, timeout=10)
-        if put_resp.status_code in (200, 201):
-            log_info(f"Commit GitHub OK: {path}")
-        else:
-            log_error(f"Errore commit GitHub: {put_resp.status_code} – {put_resp.text}")
-    except Exception as e:
-        log_error(f"Errore commit fondi_nav.csv: {e}")
+        last = datetime.fromisoformat(row.get("last_success", ""))
+    except ValueError:
+        return True
+    return now - last >= max_age
+
+def write_nav_state(fondi, state):
+    """Riscrive fondi_nav.csv nell'ordine di fondi.csv (scrittura atomica)."""
+    tmp = f"{fondi_nav_path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f_out:
+        writer = csv.DictWriter(f_out, fieldnames=NAV_FIELDS, delimiter=";", extrasaction="ignore")
+        writer.writeheader()
+        for fondo in fondi:
+            row = state.get(fondo.get("ISIN", "").strip())
+            if row:
+                writer.writerow(row)
+    os.replace(tmp, fondi_nav_path)
+
+def refresh_fondo(fondo, previous):
+    """Nuova riga di stato per un fondo; se il fetch fallisce resta l'ultimo NAV valido."""
+    nome = fondo.get("nome", "").strip()
+    url = fondo.get("url", "").strip()
+    isin = fondo.get("ISIN", "").strip()
+    now = datetime.now().isoformat()
+    previous = previous or {}
+
+    if not url:
+        log_error("%s (%s): URL mancante", nome, isin)
+        return {"timestamp": now, "nome": nome, "ISIN": isin, "nav_text_it": "NO_URL", "nav_float": "",
+                "last_success": "", "status": "NO_URL"}
+
+    nav_text = fetch_nav(url)
+    nav_float = normalize(nav_text)
+    if nav_float:
+        log_debug("%s (%s): %s", nome, isin, nav_text)
+        return {"timestamp": now, "nome": nome, "ISIN": isin, "nav_text_it": nav_text, "nav_float": nav_float,
+                "last_success": now, "status": "OK"}
+
+    log_error("%s (%s): N/D (ultimo valore valido: %s)", nome, isin, previous.get("nav_text_it") or "nessuno")
+    return {"timestamp": now, "nome": nome, "ISIN": isin,
+            "nav_text_it": previous.get("nav_text_it") or "N/D", "nav_float": previous.get("nav_float") or "N/D",
+            "last_success": previous.get("last_success", ""), "status": "ERR"}
 
 # -----------------------------
 # Main
 # -----------------------------
-def main():
+def main(progress=None, isins=None, force=False):
+    """
+    Aggiorna solo i fondi da rinfrescare (controllati da più di NAV_MAX_AGE o falliti) e fonde
+    il risultato in fondi_nav.csv.
+    isins: aggiorna solo questi ISIN (sempre, anche se appena controllati).
+    force: aggiorna tutti i fondi selezionati.
+    progress: callback opzionale progress(nome_fase), usata dai job in background.
+    """
+    # Una run alla volta tra thread e worker: stessa richiesta (ISIN/force) = stesso risultato
+    key = json.dumps({"isins": sorted(isins or []), "force": bool(force)})
+    with StageTimer("update_fondi", progress) as stage:
+        return get_flight("update_fondi").run(
+            _main, stage, isins, force, key=key, on_wait=lambda: stage("attesa_run_in_corso")
+        )
+
+def _main(stage, isins, force):
     log_info("=== INIZIO aggiornamento fondi ===")
     os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -100,48 +157,61 @@ def main():
         log_error(f"File fondi.csv non trovato: {fondi_path}")
         return
 
-    with open(fondi_path, newline="", encoding="utf-8") as f:
-        lines = [line for line in f if line.strip() and not line.strip().startswith("#")]
-
-    clean_csv = StringIO("".join(lines))
-    reader = csv.DictReader(clean_csv)
-    reader.fieldnames = [fn.strip().lstrip("\ufeff") for fn in reader.fieldnames]
-
-    fondi = [row for row in reader if any(row.values())]
-
-    with open(fondi_nav_path, "w", newline="", encoding="utf-8") as f_out:
-        writer = csv.writer(f_out, delimiter=";")
-        writer.writerow(["timestamp", "nome", "ISIN", "nav_text_it", "nav_float"])
-
-        for fondo in fondi:
-            nome = fondo.get("nome", "").strip()
-            url = fondo.get("url", "").strip()
-            isin = fondo.get("ISIN", "").strip()
-
-            if not url:
-                writer.writerow([datetime.now().isoformat(), nome, isin, "NO_URL", ""])
-                log_error(f"{nome} ({isin}): URL mancante")
-                continue
-
-            html = fetch_html(url)
-            if "eurizoncapital.com" in url:
-                nav_text = parse_eurizon(html) if html else None
-            elif "teleborsa.it" in url:
-                nav_text = parse_teleborsa(html) if html else None
-            else:
-                nav_text = None
-
-            nav_float = normalize(nav_text)
-
-            writer.writerow([
-                datetime.now().isoformat(),
-                nome,
-                isin,
-                nav_text or "N/D",
-                nav_float or "N/D"
-            ])
-            status = nav_text or "N/D"
-            log_info(f"{nome} ({isin}): {status}")
-
-    commit_csv_to_github("data/fondi_nav.csv", "fix")
-    log_info("=== FINE aggiornamento fondi ===")
\ No newline at end of file
+    fondi = load_fondi()
+    now = datetime.now()
+    state = load_nav_state()
+
+    wanted = {i.strip() for i in isins or [] if i.strip()}
+    if wanted:
+        selected = [f for f in fondi if f.get("ISIN", "").strip() in wanted]
+        not_found = sorted(wanted - {f.get("ISIN", "").strip() for f in selected})
+    else:
+        not_found = []
+        selected = fondi if force else [f for f in fondi if is_stale(state.get(f.get("ISIN", "").strip()), now)]
+
+    log_info("Fondi da aggiornare: %s/%s", len(selected), len(fondi))
+    stage("scrape", total=len(selected))
+
+    # Fetch in parallelo (il limite per host è in utils.fetcher)
+    updates = []
+    if selected:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(selected))) as pool:
+            updates = list(pool.map(lambda f: refresh_fondo(f, state.get(f.get("ISIN", "").strip())), selected))
+
+    for row in updates:
+        SCRAPES.inc(source="fondi", symbol=row["ISIN"], result="ok" if row["status"] == "OK" else "fail")
+
+    # Merge sotto lock: un altro aggiornamento (es. per ISIN) può aver scritto nel frattempo
+    with _nav_lock:
+        state = load_nav_state()
+        for row in updates:
+            state[row["ISIN"]] = row
+        write_nav_state(fondi, state)
+
+    # Storico NAV: un punto per ISIN e giorno (le colonne cambiate vanno nello stesso commit).
+    # Prima si fonde la copia su GitHub (disco effimero); se non è leggibile lo storico
+    # di quel fondo non si tocca, per non pubblicare colonne più vecchie di quelle remote
+    publisher = Publisher()
+    recorded = []
+    for row in updates:
+        if row["status"] == "OK":
+            try:
+                fondi_history.merge_remote(row["ISIN"], publisher)
+                if fondi_history.record(row["ISIN"], datetime.now().date(), row["nav_float"]):
+                    recorded.append(row["ISIN"])
+            except Exception as e:
+                log_error("Errore storico NAV %s: %s", row["ISIN"], e)
+
+    ok = sum(1 for row in updates if row["status"] == "OK")
+    if updates:
+        stage("github")
+        publisher.add("data/fondi_nav.csv", fondi_nav_path)
+        for isin in recorded:
+            for repo_path, local_path in fondi_history.repo_files(isin):
+                publisher.add(repo_path, local_path)
+        publisher.publish()
+    log_info("=== FINE aggiornamento fondi ===")
+    summary = {"fondi": len(fondi), "aggiornati": len(updates), "ok": ok, "errori": len(updates) - ok}
+    if not_found:
+        summary["isin_non_trovati"] = not_found
+    return summary
@@ -1,23 +1,173 @@
 import os
-from supabase import create_client, Client
+import threading
+import time
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 
+from utils.logger import log_info, log_error
+from utils.metrics import observe_http
+
+# ---------------------------------------------------------
+# PARAMETRI CLIENT (override da env)
+# ---------------------------------------------------------
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "10"))          # secondi per richiesta
+SUPABASE_POOL_SIZE = int(os.environ.get("SUPABASE_POOL_SIZE", "4"))         # connessioni keep-alive
+SUPABASE_HEALTH_INTERVAL = float(os.environ.get("SUPABASE_HEALTH_INTERVAL", "300"))  # 0 = disattivo
+
+# ---------------------------------------------------------
+# REGISTRO CLIENT (uno per processo, condiviso tra moduli e thread)
+# ---------------------------------------------------------
+class _ClientRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._checked_at = 0.0
+        self._env_loaded = False
+
+    def _create(self):
+        if not self._env_loaded:
+            load_dotenv()
+            self._env_loaded = True
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_ANON_KEY")
+        client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
+        _configure_pool(client)
+        log_info(f"Client Supabase creato (pool {SUPABASE_POOL_SIZE}, timeout {SUPABASE_TIMEOUT}s)")
+        return client
+
+    def get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create()
+                    self._checked_at = time.monotonic()
+                return self._client
+
+        if self._health_due():
+            with self._lock:
+                # un solo thread prenota il controllo, che gira in background:
+                # la richiesta usa subito il client attuale, senza attendere il ping
+                due = self._health_due()
+                if due:
+                    self._checked_at = time.monotonic()
+            if due:
+                threading.Thread(target=self._health_check, args=(client,), name="supabase-health",
+                                 daemon=True).start()
+        return client
+
+    def _health_due(self):
+        return SUPABASE_HEALTH_INTERVAL > 0 and time.monotonic() - self._checked_at > SUPABASE_HEALTH_INTERVAL
+
+    def _health_check(self, client):
+        """Ping fuori dal lock; se fallisce sostituisce il client (se nel frattempo nessuno l'ha già fatto)."""
+        if _ping(client):
+            return
+        log_error("Health check Supabase fallito – ricreo il client")
+        fresh = self._create()
+        with self._lock:
+            if self._client is client:
+                self._client, stale = fresh, client
+                self._checked_at = time.monotonic()
+            else:
+                stale = fresh  # già sostituito (reset o altro controllo): il nuovo non serve
+        _close(stale)
+
+    def check(self):
+        client = self.get()
+        ok = _ping(client)
+        if ok:
+            self._checked_at = time.monotonic()
+        return ok
+
+    def reset(self):
+        with self._lock:
+            if self._client is not None:
+                _close(self._client)
+            self._client = None
+
+
+# ---------------------------------------------------------
+# METRICHE HTTP (event hook httpx: latenza ed esito per host)
+# ---------------------------------------------------------
+def _on_request(request):
+    request.extensions["t0"] = time.perf_counter()
+
+
+def _on_response(response):
+    t0 = response.request.extensions.get("t0")
+    if t0 is not None:
+        observe_http(response.request.url.host, response.status_code, time.perf_counter() - t0)
+
+
+EVENT_HOOKS = {"request": [_on_request], "response": [_on_response]}
+
+
+def _configure_pool(client):
+    """
+    Sostituisce la sessione httpx di PostgREST con una a pool limitato (stessi header/timeout)
+    e con gli event hook delle metriche HTTP.
+    """
+    try:
+        from httpx import Limits
+        from postgrest.utils import SyncClient
+
+        old = client.postgrest.session
+        client.postgrest.session = SyncClient(
+            base_url=old.base_url,
+            headers=old.headers,
+            timeout=old.timeout,
+            follow_redirects=True,
+            http2=True,
+            limits=Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE),
+            event_hooks=EVENT_HOOKS,
+        )
+        old.close()
+    except Exception as e:
+        log_error(f"Pool Supabase non configurabile, uso quello di default: {e}")
+        try:
+            client.postgrest.session.event_hooks = EVENT_HOOKS
+        except Exception:
+            pass
+
+
+def _ping(client):
+    try:
+        client.table("previous_close").select("id").limit(1).execute()
+        return True
+    except Exception as e:
+        log_error(f"Ping Supabase fallito: {e}")
+        return False
+
+
+def _close(client):
+    try:
+        client.postgrest.session.close()
+    except Exception:
+        pass
+
+
+_registry = _ClientRegistry()
+
 # ---------------------------------------------------------
 # FACTORY
 # ---------------------------------------------------------
 def get_supabase() -> Client:
-    load_dotenv()
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_ANON_KEY")
-    return create_client(url, key)
+    """Client condiviso dal processo: creato una volta sola (lazy, thread-safe)."""
+    return _registry.get()
+
+def check_supabase():
+    """Health check esplicito (ricrea il client se la verifica periodica fallisce)."""
+    return _registry.check()
+
+def reset_supabase():
+    _registry.reset()
 
 # ---------------------------------------------------------
 # UPSERT PREVIOUS CLOSE
 # ---------------------------------------------------------
-def upsert_previous_close(symbol, label, close_value, snapshot_date, daily_change=None):
-    supabase = get_supabase() 
-
-    data = {
+def close_row(symbol, label, close_value, snapshot_date, daily_change=None):
+    return {
         "symbol": symbol,
         "label": label,
         "close_value": round(close_value, 2),
@@ -25,24 +175,19 @@ def upsert_previous_close(symbol, label, close_value, snapshot_date, daily_chang
         "daily_change": round(daily_change, 2) if daily_change is not None else None
     }
 
-    # 1. Controllo se esiste già una riga per symbol + snapshot_date
-    existing = (
-        supabase.table("previous_close")
-        .select("*")
-        .eq("symbol", symbol)
-        .eq("snapshot_date", snapshot_date)
+def upsert_previous_closes(rows, supabase=None):
+    """
+    Scrive tutte le chiusure della run in una sola UPSERT nativa
+    sull'indice unico (symbol, snapshot_date): niente SELECT preventiva.
+    """
+    if not rows:
+        return
+    if supabase is None:
+        supabase = get_supabase()
+
+    supabase.table("previous_close") \
+        .upsert(rows, on_conflict="symbol,snapshot_date") \
         .execute()
-    )
-
-    # 2. Se esiste → UPDATE
-    if existing.data:
-        supabase.table("previous_close") \
-            .update(data) \
-            .eq("symbol", symbol) \
-            .eq("snapshot_date", snapshot_date) \
-            .execute()
-    else:
-        # 3. Se non esiste → INSERT
-        supabase.table("previous_close") \
-            .insert(data) \
-            .execute()
+
+def upsert_previous_close(symbol, label, close_value, snapshot_date, daily_change=None, supabase=None):
+    upsert_previous_closes([close_row(symbol, label, close_value, snapshot_date, daily_change)], supabase)
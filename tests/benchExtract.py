@@ -0,0 +1,34 @@
+import os
+import time
+import tracemalloc
+from utils.extract import ls_tc_mid, eurizon_nav, teleborsa_price
+from testExtract import load, bs4_ls_tc, bs4_eurizon, bs4_teleborsa
+
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "20"))
+
+def measure(fn, *args):
+    """Tempo medio (ms) e picco di memoria allocata (KiB) per chiamata."""
+    fn(*args)  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(*args)
+    elapsed = (time.perf_counter() - t0) / ROUNDS * 1000
+
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+if __name__ == "__main__":
+    cases = [
+        ("ls-tc", "ls_tc_etf.html", bs4_ls_tc, ls_tc_mid, ("1045562",)),
+        ("eurizon", "eurizon_fondo.html", bs4_eurizon, eurizon_nav, ()),
+        ("teleborsa", "teleborsa_titolo.html", bs4_teleborsa, teleborsa_price, ()),
+    ]
+    print(f"{'pagina':<10} {'KiB':>6} | {'bs4 ms':>8} {'bs4 KiB':>9} | {'new ms':>8} {'new KiB':>9} | {'speedup':>7}")
+    for name, fixture, old, new, extra in cases:
+        html = load(fixture)
+        t_old, m_old = measure(old, html, *extra)
+        t_new, m_new = measure(new, html, *extra)
+        print(f"{name:<10} {len(html) / 1024:>6.0f} | {t_old:>8.2f} {m_old:>9.0f} | {t_new:>8.3f} {m_new:>9.1f} | {t_old / t_new:>6.0f}x")
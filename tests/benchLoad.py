@@ -0,0 +1,324 @@
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# ---------------------------------------------------------
+# LOAD TEST DEGLI ENDPOINT DI LETTURA (limiti fly.toml: soft 25, hard 50)
+# ---------------------------------------------------------
+# Genera carico su /api/market-status, sui CSV e sulle pagine statiche e riporta
+# p50/p90/p99 per endpoint e il throughput complessivo.
+#
+#   --server inproc    Flask test client nello stesso processo (solo costo dell'app)
+#   --server werkzeug  server threaded locale su socket (HTTP vero, keep-alive)
+#   --server gunicorn  gunicorn con la stessa configurazione del Dockerfile (gthread, 16 thread)
+#   --url http://...   un server già avviato (es. fly)
+#
+#   PYTHONPATH=. python tests/benchLoad.py --server werkzeug --concurrency 1,25,50
+#   PYTHONPATH=. python tests/benchLoad.py --server werkzeug --during-update --symbols 100 --latency 0.05
+#
+# --during-update lancia /api/update-all?sync=1 (pipeline vera contro gli stand-in di
+# tests/standins.py, in una cartella temporanea) e misura le letture finché l'update
+# non termina, confrontandole con lo stesso carico a riposo.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+ENDPOINTS = [
+    "/api/market-status",
+    "/salvadanaio.csv",
+    "/fondi.csv",
+    "/",
+    "/market",
+    "/market-mobile",
+    "/salvadanaio",
+    "/fondi",
+    "/market-live",
+]
+CONCURRENCY = (1, 25, 50)       # fly.toml: soft_limit 25, hard_limit 50
+REQUESTS = 2000                 # richieste per livello di concurrency
+GUNICORN_THREADS = 16           # come nel Dockerfile
+HEADERS = {"Accept-Encoding": "br, gzip", "User-Agent": "benchLoad"}
+
+
+# ---------------------------------------------------------
+# CLIENT (uno per thread)
+# ---------------------------------------------------------
+class SocketClient:
+    """Connessione HTTP/1.1 keep-alive; riapre la connessione se il server la chiude."""
+
+    def __init__(self, base_url):
+        host, _, port = base_url.split("://", 1)[1].rstrip("/").partition(":")
+        self.host, self.port = host, int(port or 80)
+        self.conn = None
+
+    def get(self, path):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=620)
+            try:
+                self.conn.request("GET", path, headers=HEADERS)
+                r = self.conn.getresponse()
+                r.read()
+                if r.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return r.status
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        r = self.client.get(path, headers=HEADERS)
+        r.close()
+        return r.status_code
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------
+# GENERATORE DI CARICO
+# ---------------------------------------------------------
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run_load(make_client, concurrency, total=None, until=None, endpoints=ENDPOINTS):
+    """
+    concurrency thread che ciclano sugli endpoint finché non sono state fatte `total`
+    richieste oppure finché until() è vero. Ritorna latenze per endpoint, errori e durata.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(offset):
+        client = make_client()
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        start.wait()
+        try:
+            while True:
+                with lock:
+                    i = next(counter)
+                if (total is not None and i >= total) or (until is not None and until()):
+                    break
+                path = endpoints[(i + offset) % len(endpoints)]
+                t0 = time.perf_counter()
+                try:
+                    status = client.get(path)
+                except Exception:
+                    status = None
+                local[path].append(time.perf_counter() - t0)
+                if status is None or status >= 500:
+                    local_errors[path] += 1
+        finally:
+            client.close()
+            with lock:
+                for path, values in local.items():
+                    latencies[path].extend(values)
+                for path, n in local_errors.items():
+                    errors[path] += n
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - t0
+
+
+def report(title, latencies, errors, elapsed):
+    print(f"\n{title}")
+    print(f"{'endpoint':<22} {'n':>6} {'err':>5} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    everything = []
+    for path in sorted(latencies):
+        values = sorted(latencies[path])
+        everything.extend(values)
+        print(f"{path:<22} {len(values):>6} {errors.get(path, 0):>5} {percentile(values, 50) * 1000:>8.1f} "
+              f"{percentile(values, 90) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f} {values[-1] * 1000:>8.1f}")
+    everything.sort()
+    total_errors = sum(errors.values())
+    print(f"{'TOTALE':<22} {len(everything):>6} {total_errors:>5} {percentile(everything, 50) * 1000:>8.1f} "
+          f"{percentile(everything, 90) * 1000:>8.1f} {percentile(everything, 99) * 1000:>8.1f} "
+          f"{(everything[-1] if everything else 0) * 1000:>8.1f}")
+    print(f"throughput: {len(everything) / elapsed:.0f} req/s in {elapsed:.2f}s")
+    return {
+        "n": len(everything), "errors": total_errors, "rps": len(everything) / elapsed,
+        "p50": percentile(everything, 50), "p90": percentile(everything, 90), "p99": percentile(everything, 99),
+    }
+
+
+# ---------------------------------------------------------
+# SERVER
+# ---------------------------------------------------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_werkzeug(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class Handler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, come dietro il proxy di fly
+
+        def log_request(self, *args):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def start_gunicorn():
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "--worker-class", "gthread",
+         "--threads", str(GUNICORN_THREADS), "--timeout", "600", "--log-level", "warning", "app:app"],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        proc.kill()
+        raise RuntimeError("gunicorn non è partito")
+
+    def stop():
+        proc.terminate()
+        proc.wait(10)
+    return f"http://127.0.0.1:{port}", stop
+
+
+# ---------------------------------------------------------
+# MODALITÀ "DURANTE L'UPDATE"
+# ---------------------------------------------------------
+def during_update(args, make_client, base_url):
+    """Carico a riposo, poi lo stesso carico mentre gira /api/update-all?sync=1."""
+    from benchPipeline import history_rows, prepare_workdir, redirect_pipeline
+    from standins import GitHub, PostgREST, QuotePages
+
+    opts = {"latency": args.latency, "jitter": args.jitter}
+    servers = {"pages": QuotePages(**opts).start(), "postgrest": PostgREST(**opts).start(),
+               "github": GitHub(**opts).start()}
+    servers["postgrest"].seed(history_rows(args.symbols))
+    workdir = tempfile.mkdtemp(prefix="benchload_")
+    try:
+        prepare_workdir(workdir, args.symbols, servers["pages"].url)
+        redirect_pipeline(workdir, args.symbols, {name: s.url for name, s in servers.items()})
+
+        concurrency = args.concurrency[-1]
+        results = {}
+        idle = run_load(make_client, concurrency, total=args.requests, endpoints=args.endpoints)
+        results["riposo"] = report(f"A RIPOSO (concurrency {concurrency})", *idle)
+
+        done = threading.Event()
+        update = {}
+
+        def trigger():
+            t0 = time.perf_counter()
+            try:
+                update["status"] = SocketClient(base_url).get("/api/update-all?sync=1") if base_url \
+                    else make_client().get("/api/update-all?sync=1")
+            finally:
+                update["seconds"] = time.perf_counter() - t0
+                done.set()
+
+        threading.Thread(target=trigger, daemon=True).start()
+        busy = run_load(make_client, concurrency, until=done.is_set, endpoints=args.endpoints)
+        results["update"] = report(
+            f"DURANTE /api/update-all?sync=1 ({args.symbols} simboli, concurrency {concurrency})", *busy
+        )
+        print(f"\nupdate-all: HTTP {update.get('status')} in {update.get('seconds', 0):.2f}s")
+        ratio = results["update"]["p99"] / results["riposo"]["p99"] if results["riposo"]["p99"] else 0
+        print(f"p99 durante l'update: {ratio:.1f}x rispetto al riposo")
+        return results
+    finally:
+        for s in servers.values():
+            s.stop()
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test degli endpoint di lettura")
+    parser.add_argument("--server", choices=("inproc", "werkzeug", "gunicorn"), default="werkzeug")
+    parser.add_argument("--url", help="server già avviato (ignora --server)")
+    parser.add_argument("--concurrency", default=",".join(map(str, CONCURRENCY)),
+                        type=lambda s: [int(x) for x in s.split(",") if x])
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="richieste per livello")
+    parser.add_argument("--endpoints", type=lambda s: s.split(","), default=ENDPOINTS)
+    parser.add_argument("--during-update", action="store_true", help="carico durante /api/update-all?sync=1")
+    parser.add_argument("--symbols", type=int, default=100, help="ETF della pipeline in --during-update")
+    parser.add_argument("--latency", type=float, default=0.02, help="latenza degli stand-in (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # prima di importare app: bot_telegram crea il bot all'import e vuole un token
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TELEGRAM_TOKEN", "0:bench")
+    if args.during_update and (args.url or args.server == "gunicorn"):
+        parser.error("--during-update richiede --server inproc o werkzeug (pipeline nello stesso processo)")
+
+    stop = None
+    base_url = args.url
+    if not base_url and args.server == "gunicorn":
+        base_url, stop = start_gunicorn()
+
+    app = None
+    if not base_url:
+        from app import app
+        if args.server == "werkzeug":
+            base_url, stop = start_werkzeug(app)
+
+    def make_client():
+        return SocketClient(base_url) if base_url else InProcessClient(app)
+
+    print(f"Server: {base_url or 'in-process (Flask test client)'}")
+    try:
+        if args.during_update:
+            during_update(args, make_client, base_url)
+            return 0
+        for concurrency in args.concurrency:
+            result = run_load(make_client, concurrency, total=args.requests, endpoints=args.endpoints)
+            report(f"CONCURRENCY {concurrency}", *result)
+    finally:
+        if stop:
+            stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
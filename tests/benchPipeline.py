@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# ---------------------------------------------------------
+# BENCHMARK END-TO-END OFFLINE (update_all_etf + scraper_fondi.main)
+# ---------------------------------------------------------
+# Avvia gli stand-in locali (tests/standins.py) e lancia la pipeline vera per 7, 100 e
+# 1000 simboli. Ogni misura gira in un processo figlio (RSS di picco pulito, nessuna
+# cache in memoria condivisa); lo stato su disco (mirror, cache HTTP, cache GitHub)
+# resta nella cartella di lavoro, quindi la seconda run è quella "a regime".
+#
+#   PYTHONPATH=. python tests/benchPipeline.py                      # 7,100,1000
+#   PYTHONPATH=. python tests/benchPipeline.py --sizes 7,100 --latency 0.02 --fail-rate 0.05
+#   PYTHONPATH=. python tests/benchPipeline.py --save bench.json     # salva la baseline
+#   PYTHONPATH=. python tests/benchPipeline.py --baseline bench.json # ❌ (exit 1) se peggiora
+#
+# Alert Alexa e report Telegram non hanno uno stand-in: nel figlio sono disattivati.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+SIZES = (7, 100, 1000)
+SESSIONS = 250          # chiusure storiche per simbolo nel PostgREST finto
+PIPELINES = ("etf", "fondi")
+PHASES = ("cold", "warm")
+
+
+def etf_list(n):
+    return [{"symbol": f"ETF{i:04d}", "label": f"Bench ETF {i}", "item_id": str(9000000 + i)} for i in range(n)]
+
+
+def fondi_rows(n, pages_url):
+    rows = []
+    for i in range(n):
+        isin = f"IT{i:010d}"
+        site = "eurizoncapital.com" if i % 2 == 0 else "teleborsa.it"
+        rows.append({"nome": f"Fondo {i}", "ISIN": isin, "url": f"{pages_url}/{site}/{isin}"})
+    return rows
+
+
+def history_rows(n, sessions=SESSIONS, today=None):
+    rng = random.Random(n)
+    day = (today or date.today()) - timedelta(days=1)
+    days = []
+    while len(days) < sessions:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day -= timedelta(days=1)
+    days.reverse()
+    rows = []
+    for etf in etf_list(n):
+        price = rng.uniform(20, 300)
+        for d in days:
+            price *= 1 + rng.gauss(0, 0.01)
+            rows.append({"symbol": etf["symbol"], "label": etf["label"], "close_value": round(price, 2),
+                         "snapshot_date": d, "daily_change": None})
+    return rows
+
+
+def peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KiB
+
+
+# ---------------------------------------------------------
+# PROCESSO FIGLIO: una pipeline, una fase
+# ---------------------------------------------------------
+def redirect_pipeline(workdir, n, urls, market_open=True):
+    """
+    Punta la pipeline vera agli stand-in (urls: pages/postgrest/github) e a una cartella
+    di lavoro: nessun file del repo viene toccato. Usata anche da benchLoad.py.
+    """
+    os.environ.update({
+        "GITHUB_TOKEN": "bench",
+        "GITHUB_API_URL": urls["github"],
+        "SUPABASE_URL": urls["postgrest"],
+        "SUPABASE_ANON_KEY": "bench.bench.bench",
+        "SUPABASE_HEALTH_INTERVAL": "0",
+    })
+    os.environ.setdefault("TELEGRAM_TOKEN", "0:bench")
+    data_dir = os.path.join(workdir, "data")
+
+    import bot_telegram
+    import check_alert
+    import fondi_history
+    import github_publisher
+    import market_state
+    import price_history
+    import scraper_etf
+    import scraper_fondi
+    from supabase_client import reset_supabase
+    from utils import http_cache, singleflight
+    from utils.series_store import SeriesStore
+
+    reset_supabase()
+    github_publisher.API_URL = urls["github"]
+    github_publisher.CACHE_PATH = os.path.join(data_dir, ".github_publish.json")
+    market_state.MARKET_PATH = os.path.join(data_dir, "market.json")
+    market_state.invalidate()
+    price_history._mirror = price_history.HistoryMirror(os.path.join(data_dir, "history"))
+    http_cache._cache = http_cache.HttpCache(os.path.join(data_dir, "http_cache"))
+    singleflight.LOCK_DIR = os.path.join(data_dir, "locks")
+    fondi_history.HISTORY_DIR = os.path.join(data_dir, "fondi_history")
+    fondi_history._store = SeriesStore(fondi_history.HISTORY_DIR)
+    scraper_fondi.DATA_DIR = data_dir
+    scraper_fondi.fondi_path = os.path.join(data_dir, "fondi.csv")
+    scraper_fondi.fondi_nav_path = os.path.join(data_dir, "fondi_nav.csv")
+
+    etfs = etf_list(n)
+    scraper_etf.LS_TC_URL = urls["pages"] + "/de/etf/{item_id}"
+    scraper_etf.load_etfs = lambda: etfs
+    scraper_etf.is_market_open = lambda: market_open
+    check_alert.check_alert = lambda: None
+    bot_telegram.send_monthly_report = lambda: None
+
+
+def run_child(pipeline, n, workdir, urls, market_open=True):
+    os.chdir(workdir)
+    redirect_pipeline(workdir, n, urls, market_open)
+    import scraper_etf
+    import scraper_fondi
+
+    t0 = time.perf_counter()
+    if pipeline == "etf":
+        results, _ = scraper_etf.update_all_etf()
+        ok = sum(1 for r in results.values() if r.get("status") != "unavailable")
+    else:
+        summary = scraper_fondi.main(force=True) or {}
+        ok = summary.get("ok", 0)
+    wall = time.perf_counter() - t0
+    return {"wall_s": round(wall, 3), "ok": ok, "rss_mb": round(peak_rss_mb(), 1)}
+
+
+# ---------------------------------------------------------
+# PROCESSO PADRE: stand-in, workdir, misure, confronto con la baseline
+# ---------------------------------------------------------
+def start_standins(args):
+    from standins import GitHub, PostgREST, QuotePages
+    opts = {"latency": args.latency, "jitter": args.jitter, "fail_rate": args.fail_rate}
+    return {
+        "pages": QuotePages(**opts).start(),
+        "postgrest": PostgREST(**opts).start(),
+        "github": GitHub(**opts).start(),
+    }
+
+
+def prepare_workdir(workdir, n, pages_url):
+    import csv
+    import shutil
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    shutil.copy(os.path.join(ROOT, "data", "market.json"), data_dir)
+    with open(os.path.join(data_dir, "fondi.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["nome", "ISIN", "url"])
+        writer.writeheader()
+        writer.writerows(fondi_rows(n, pages_url))
+
+
+def measure(pipeline, n, workdir, servers, closed=False):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.setdefault("LOG_LEVEL", "WARNING")
+    for s in servers.values():
+        s.reset()
+    urls = {name: s.url for name, s in servers.items()}
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", pipeline, "--n", str(n),
+           "--workdir", workdir, "--urls", json.dumps(urls)] + (["--closed"] if closed else [])
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{pipeline} n={n} fallito:\n{out.stderr[-2000:]}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    trips = {}
+    for s in servers.values():
+        trips.update(s.requests)
+    result["round_trips"] = dict(sorted(trips.items()))
+    return result
+
+
+def run_bench(args):
+    servers = start_standins(args)
+    results = {}
+    try:
+        for n in args.sizes:
+            servers["postgrest"].seed(history_rows(n))
+            with tempfile.TemporaryDirectory(prefix=f"bench{n}_") as workdir:
+                prepare_workdir(workdir, n, servers["pages"].url)
+                for pipeline in PIPELINES:
+                    for phase in PHASES:
+                        r = measure(pipeline, n, workdir, servers, args.closed)
+                        results[f"{pipeline}/{n}/{phase}" + ("/closed" if args.closed else "")] = r
+                        trips = " ".join(f"{k}={v}" for k, v in r["round_trips"].items())
+                        print(f"{pipeline:<6} {n:>5} {phase:<5} | {r['wall_s']:>8.3f}s | ok {r['ok']:>5} | "
+                              f"RSS {r['rss_mb']:>6.1f} MB | {trips}", flush=True)
+    finally:
+        for s in servers.values():
+            s.stop()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressioni rispetto alla baseline: tempo oltre la tolleranza o più round trip."""
+    failures = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if r["wall_s"] > base["wall_s"] * (1 + tolerance) and r["wall_s"] - base["wall_s"] > 0.05:
+            failures.append(f"{key}: {base['wall_s']}s -> {r['wall_s']}s")
+        if r["rss_mb"] > base["rss_mb"] * (1 + tolerance):
+            failures.append(f"{key}: RSS {base['rss_mb']} MB -> {r['rss_mb']} MB")
+        for host, count in r["round_trips"].items():
+            if count > base["round_trips"].get(host, 0) * (1 + tolerance):
+                failures.append(f"{key}: {host} {base['round_trips'].get(host, 0)} -> {count} richieste")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline della pipeline di aggiornamento")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        type=lambda s: [int(x) for x in s.split(",") if x])
+    parser.add_argument("--latency", type=float, default=0.0, help="latenza per richiesta (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latenza casuale aggiuntiva (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="quota di risposte 503")
+    parser.add_argument("--closed", action="store_true", help="mercato chiuso (la prima run è completa)")
+    parser.add_argument("--save", help="salva i risultati (JSON) come baseline")
+    parser.add_argument("--baseline", help="confronta con una baseline salvata")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="peggioramento ammesso (0.25 = 25%%)")
+    parser.add_argument("--child", choices=PIPELINES, help=argparse.SUPPRESS)
+    parser.add_argument("--n", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--urls", type=json.loads, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.n, args.workdir, args.urls, not args.closed)))
+        return 0
+
+    results = run_bench(args)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline salvata in {args.save}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        for line in failures:
+            print(f"❌ {line}")
+        if failures:
+            return 1
+        print("✅ Nessuna regressione rispetto alla baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from github_publisher import blob_sha
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# ---------------------------------------------------------
+# SERVER LOCALI CHE SOSTITUISCONO I SERVIZI ESTERNI (benchmark offline)
+# ---------------------------------------------------------
+# Ogni stand-in è un ThreadingHTTPServer su 127.0.0.1 con latenza e fallimenti
+# configurabili e il conteggio delle richieste ricevute (round trip).
+
+
+def _load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def _price_it(value):
+    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+class StandIn:
+    """Server HTTP locale: latency (s) + jitter, fail_rate (quota di 503)."""
+
+    name = "standin"
+
+    def __init__(self, latency=0.0, jitter=0.0, fail_rate=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.requests = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self):
+                with standin._lock:
+                    standin.requests[standin.route(self.path)] += 1
+                    fail = standin._rng.random() < standin.fail_rate
+                    delay = standin.latency + standin._rng.random() * standin.jitter
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    return self._send(503, b"injected failure", "text/plain")
+                status, payload, ctype, headers = standin.handle(self.command, self.path, self.headers, body)
+                self._send(status, payload, ctype, headers)
+
+            def _send(self, status, payload, ctype, headers=None):
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_HEAD = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"standin-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def route(self, path):
+        """Etichetta con cui contare la richiesta (round trip)."""
+        return self.name
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+
+    def handle(self, method, path, headers, body):
+        raise NotImplementedError
+
+
+# ---------------------------------------------------------
+# PAGINE REGISTRATE (ls-tc.de, Eurizon, Teleborsa)
+# ---------------------------------------------------------
+class QuotePages(StandIn):
+    """
+    /de/etf/<item_id>            pagina ls-tc con il mid dell'item
+    /eurizoncapital.com/<isin>   pagina fondo Eurizon
+    /teleborsa.it/<isin>         pagina certificato Teleborsa
+    I prezzi sono deterministici per id; `etag=True` abilita ETag/304 sulle pagine NAV.
+    """
+
+    name = "pages"
+    LS_TC_ITEM = "1045562@1"
+    LS_TC_MID = "111,7125"
+    EURIZON_NAV = "228,41"
+    TELEBORSA_PRICE = "548,53"
+
+    def __init__(self, etag=True, **kw):
+        super().__init__(**kw)
+        self.etag = etag
+        self.ls_tc = _load("ls_tc_etf.html")
+        self.eurizon = _load("eurizon_fondo.html")
+        self.teleborsa = _load("teleborsa_titolo.html")
+
+    def route(self, path):
+        if path.startswith("/de/etf/"):
+            return "ls-tc"
+        return "eurizon" if path.startswith("/eurizoncapital.com/") else "teleborsa"
+
+    @staticmethod
+    def price(key):
+        return 10 + int(hashlib.blake2b(key.encode(), digest_size=4).hexdigest(), 16) % 50000 / 100
+
+    def handle(self, method, path, headers, body):
+        path = urlsplit(path).path
+        key = path.rsplit("/", 1)[-1]
+        value = _price_it(self.price(key))
+        if path.startswith("/de/etf/"):
+            html = self.ls_tc.replace(self.LS_TC_ITEM, f"{key}@1").replace(self.LS_TC_MID, value, 1)
+            return 200, html, "text/html; charset=utf-8", {}
+
+        if path.startswith("/eurizoncapital.com/"):
+            template, placeholder = self.eurizon, self.EURIZON_NAV
+        elif path.startswith("/teleborsa.it/"):
+            template, placeholder = self.teleborsa, self.TELEBORSA_PRICE
+        else:
+            return 404, "not found", "text/plain", {}
+
+        tag = f'"{key}-{value}"'
+        if self.etag and headers.get("If-None-Match") == tag:
+            return 304, b"", "text/html", {"ETag": tag}
+        extra = {"ETag": tag} if self.etag else {}
+        return 200, template.replace(placeholder, value, 1), "text/html; charset=utf-8", extra
+
+
+# ---------------------------------------------------------
+# POSTGREST (tabella previous_close)
+# ---------------------------------------------------------
+_TERM = re.compile(r"^([a-z_]+)\.(eq|gt|gte|lt|lte)\.(.*)$")
+
+
+def _split_top(expr):
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(expr):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return parts
+
+
+def _coerce(column, value):
+    return int(value) if column == "id" else value
+
+
+def _predicate(expr):
+    """Filtri PostgREST usati dall'app: col.op.val, and(...), or(...)."""
+    if expr.startswith(("and(", "or(")):
+        op, inner = expr.split("(", 1)
+        preds = [_predicate(p) for p in _split_top(inner[:-1])]
+        return (lambda r: all(p(r) for p in preds)) if op == "and" else (lambda r: any(p(r) for p in preds))
+    col, op, val = _TERM.match(expr).groups()
+    val = _coerce(col, val)
+    ops = {
+        "eq": lambda a: a == val, "gt": lambda a: a > val, "gte": lambda a: a >= val,
+        "lt": lambda a: a < val, "lte": lambda a: a <= val,
+    }[op]
+    return lambda r: ops(r[col])
+
+
+class PostgREST(StandIn):
+    """GET con select/or/filtri/order/limit/offset, count=exact, POST upsert su on_conflict."""
+
+    name = "postgrest"
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.seed([])
+
+    def seed(self, rows):
+        """Svuota la tabella e la riempie con rows."""
+        with self._lock:
+            self.rows = []      # ordinate per id
+            self.ids = []
+            self.by_key = {}    # (symbol, snapshot_date) -> riga
+            self.next_id = 1
+            for row in rows:
+                self._upsert(row)
+
+    def _upsert(self, row):
+        key = (row["symbol"], row["snapshot_date"])
+        existing = self.by_key.get(key)
+        if existing:
+            existing.update({k: v for k, v in row.items() if k != "id"})
+            return existing
+        new = {"id": self.next_id, "symbol": row["symbol"], "close_value": row["close_value"],
+               "snapshot_date": row["snapshot_date"], "label": row.get("label"),
+               "daily_change": row.get("daily_change")}
+        self.next_id += 1
+        self.rows.append(new)
+        self.ids.append(new["id"])
+        self.by_key[key] = new
+        return new
+
+    def handle(self, method, path, headers, body):
+        parts = urlsplit(path)
+        if not parts.path.endswith("/previous_close"):
+            return 404, "[]", "application/json", {}
+        params = parse_qs(parts.query, keep_blank_values=True)
+
+        if method == "POST":
+            with self._lock:
+                rows = json.loads(body or b"[]")
+                out = [dict(self._upsert(r)) for r in (rows if isinstance(rows, list) else [rows])]
+            return 201, json.dumps(out), "application/json", {}
+
+        preds, start_id = [], None
+        for name, values in params.items():
+            for value in values:
+                if name == "or":
+                    preds.append(_predicate(f"or{value}"))
+                elif name == "and":
+                    preds.append(_predicate(f"and{value}"))
+                elif name not in ("select", "order", "limit", "offset"):
+                    op, val = value.split(".", 1)
+                    preds.append(_predicate(f"{name}.{op}.{val}"))
+                    if name == "id" and op in ("gt", "gte"):
+                        start_id = int(val) + (op == "gt") - 1
+        limit = int(params.get("limit", ["1000"])[0])
+        offset = int(params.get("offset", ["0"])[0])
+        order = [o.split(".")[0] for o in params.get("order", ["id"])[0].split(",")]
+
+        with self._lock:
+            rows, ids = self.rows, self.ids
+            i = bisect_right(ids, start_id) if start_id is not None else 0
+            if order == ["id"] and not preds:
+                matched = rows[offset:offset + limit]
+            elif order == ["id"]:
+                matched, skipped = [], 0
+                for row in rows[i:] if i else rows:
+                    if all(p(row) for p in preds):
+                        if skipped < offset:
+                            skipped += 1
+                            continue
+                        matched.append(row)
+                        if len(matched) >= limit:
+                            break
+            else:
+                matched = sorted((r for r in rows if all(p(r) for p in preds)), key=lambda r: [r[c] for c in order])
+                matched = matched[offset:offset + limit]
+            total = len(rows)
+
+        select = params.get("select", ["*"])[0]
+        if select != "*":
+            cols = select.split(",")
+            matched = [{c: r[c] for c in cols} for r in matched]
+        else:
+            matched = [dict(r) for r in matched]
+        extra = {}
+        if "count=exact" in headers.get("Prefer", ""):
+            extra["Content-Range"] = f"{offset}-{offset + max(len(matched), 1) - 1}/{total}"
+        return 200, json.dumps(matched), "application/json", extra
+
+
+# ---------------------------------------------------------
+# GITHUB (Git Data API usata da github_publisher)
+# ---------------------------------------------------------
+class GitHub(StandIn):
+    name = "github"
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.trees = {"t0": {}}
+        self.commits = {"c0": "t0"}
+        self.head = "c0"
+        self.blobs = {}      # sha -> bytes (sha git vero, come GitHub)
+        self.uploaded_bytes = 0
+        self._n = 0
+
+    def _sha(self, prefix):
+        self._n += 1
+        return f"{prefix}{self._n:039d}"
+
+    def handle(self, method, path, headers, body):
+        p = urlsplit(path).path
+        m = re.search(r"/repos/[^/]+/[^/]+/(.*)$", p)
+        route = m.group(1) if m else ""
+        data = json.loads(body) if body else {}
+        self.uploaded_bytes += len(body)
+        with self._lock:
+            if method == "GET" and route.startswith("git/ref/heads/"):
+                return 200, json.dumps({"object": {"sha": self.head}}), "application/json", {}
+            if method == "GET" and route.startswith("git/commits/"):
+                return 200, json.dumps({"tree": {"sha": self.commits[route.rsplit("/", 1)[1]]}}), "application/json", {}
+            if method == "GET" and route.startswith("git/trees/"):
+                tree = self.trees[route.rsplit("/", 1)[1]]
+                entries = [{"path": k, "type": "blob", "sha": v} for k, v in tree.items()]
+                return 200, json.dumps({"tree": entries}), "application/json", {}
+            if method == "GET" and route.startswith("git/blobs/"):
+                content = self.blobs.get(route.rsplit("/", 1)[1])
+                if content is None:
+                    return 404, "{}", "application/json", {}
+                return 200, json.dumps({"content": base64.b64encode(content).decode("ascii"),
+                                        "encoding": "base64"}), "application/json", {}
+            if method == "POST" and route == "git/blobs":
+                content = base64.b64decode(data["content"])
+                sha = blob_sha(content)
+                self.blobs[sha] = content
+                return 201, json.dumps({"sha": sha}), "application/json", {}
+            if method == "POST" and route == "git/trees":
+                tree = dict(self.trees[data["base_tree"]])
+                for e in data["tree"]:
+                    if e.get("sha") is None and "content" not in e:
+                        tree.pop(e["path"], None)
+                    elif "content" in e:
+                        content = e["content"].encode("utf-8")
+                        tree[e["path"]] = blob_sha(content)
+                        self.blobs[tree[e["path"]]] = content
+                    else:
+                        tree[e["path"]] = e["sha"]
+                sha = self._sha("t")
+                self.trees[sha] = tree
+                return 201, json.dumps({"sha": sha}), "application/json", {}
+            if method == "POST" and route == "git/commits":
+                sha = self._sha("c")
+                self.commits[sha] = data["tree"]
+                return 201, json.dumps({"sha": sha}), "application/json", {}
+            if method == "PATCH" and route.startswith("git/refs/heads/"):
+                self.head = data["sha"]
+                return 200, json.dumps({"object": {"sha": self.head}}), "application/json", {}
+        return 404, "{}", "application/json", {}
@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, timedelta
 from utils.holidays import easter_date
 
 def test_easter_year(year, expected_date_str):
@@ -11,7 +11,7 @@ def test_easter_year(year, expected_date_str):
 
 def test_pasquetta_year(year, expected_date_str):
     easter = easter_date(year)
-    pasquetta = date(easter.year, easter.month, easter.day + 1)
+    pasquetta = easter + timedelta(days=1)
     expected = date.fromisoformat(expected_date_str)
     if pasquetta == expected:
         print(f"✅ Pasquetta {year}: OK ({pasquetta})")
@@ -0,0 +1,71 @@
+import os
+import re
+from bs4 import BeautifulSoup
+from utils.extract import ls_tc_mid, eurizon_nav, teleborsa_price
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+# Implementazioni BeautifulSoup originali, come riferimento
+def bs4_ls_tc(html, item_id):
+    mid = BeautifulSoup(html, "html.parser").find("span", attrs={"field": "mid", "item": f"{item_id}@1"})
+    return mid.text.strip() if mid and mid.text.strip() else None
+
+def bs4_eurizon(html):
+    soup = BeautifulSoup(html, "html.parser")
+    span = soup.find("span", class_="product-dashboard-token-value-bold")
+    if span and span.get_text(strip=True):
+        return span.get_text(strip=True)
+    match = re.search(r"\d{1,3}(\.\d{3})*,\d{2}", soup.get_text())
+    return match.group(0) if match else None
+
+def bs4_teleborsa(html):
+    soup = BeautifulSoup(html, "html.parser")
+    price_span = soup.find("span", id="ctl00_phContents_ctlHeader_lblPrice")
+    if price_span and price_span.get_text(strip=True):
+        return price_span.get_text(strip=True)
+    alt = soup.find("span", id=re.compile(r"lblPrice", re.I))
+    if alt and alt.get_text(strip=True):
+        return alt.get_text(strip=True)
+    match = re.search(r"\d{1,3}(\.\d{3})*,\d{2}", soup.get_text())
+    return match.group(0) if match else None
+
+def check(name, got, expected):
+    if got == expected:
+        print(f"✅ {name}: OK ({got})")
+    else:
+        print(f"❌ {name}: atteso {expected!r}, ottenuto {got!r}")
+
+if __name__ == "__main__":
+    ls = load("ls_tc_etf.html")
+    ez = load("eurizon_fondo.html")
+    tb = load("teleborsa_titolo.html")
+
+    # Fixture registrate: stesso risultato del parser BeautifulSoup
+    check("ls-tc mid", ls_tc_mid(ls, "1045562"), bs4_ls_tc(ls, "1045562"))
+    check("ls-tc item assente", ls_tc_mid(ls, "999"), bs4_ls_tc(ls, "999"))
+    check("eurizon", eurizon_nav(ez), bs4_eurizon(ez))
+    check("teleborsa", teleborsa_price(tb), bs4_teleborsa(tb))
+
+    # Casi limite
+    cases = [
+        ("attributi in altro ordine", '<span item="7@1" class="x" field="mid"> 1,5 </span>'),
+        ("apici singoli", "<span field='mid' item='7@1'>2,5</span>"),
+        ("testo annidato", '<span field="mid" item="7@1"><b>3</b>,5</span>'),
+        ("needle nel testo", '<p>item="7@1"</p><span field="mid" item="7@1">4,5</span>'),
+        ("span vuoto", '<span field="mid" item="7@1"> </span>'),
+    ]
+    for name, html in cases:
+        check(f"ls-tc {name}", ls_tc_mid(html, "7"), bs4_ls_tc(html, "7"))
+
+    fallback = '<script>var p="9,99";</script><div>NAV <b>1.234,56</b> EUR</div>'
+    check("eurizon fallback testo", eurizon_nav(fallback), bs4_eurizon(fallback))
+    alt = '<span id="ctl00_other_LblPRICE">7,77</span>'
+    check("teleborsa id alternativo", teleborsa_price(alt), bs4_teleborsa(alt))
+    empty = '<span id="ctl00_phContents_ctlHeader_lblPrice"></span><p>12,34</p>'
+    check("teleborsa span vuoto", teleborsa_price(empty), bs4_teleborsa(empty))
+
+    print("Test estrazione HTML completati.")
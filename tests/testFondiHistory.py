@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import fondi_history
+import github_publisher
+from github_publisher import Publisher
+from standins import GitHub
+from utils.series_store import SeriesStore
+
+ISIN = "IT0000000001"
+
+def check(name, result, expected):
+    if result == expected:
+        print(f"✅ {name}: OK ({result})")
+    else:
+        print(f"❌ {name}: atteso {expected}, ottenuto {result}")
+
+def use_dir(folder):
+    fondi_history.HISTORY_DIR = folder
+    fondi_history._store = SeriesStore(folder)
+
+def publish_history():
+    publisher = Publisher(token="test")
+    for repo_path, local_path in fondi_history.repo_files(ISIN):
+        publisher.add(repo_path, local_path)
+    return publisher.publish()
+
+def remote_days(folder):
+    """Storico su GitHub, scaricato in una cartella vuota."""
+    use_dir(folder)
+    fondi_history.merge_remote(ISIN, Publisher(token="test"))
+    return [d for d, _ in fondi_history.series(ISIN)]
+
+if __name__ == "__main__":
+    gh = GitHub().start()
+    github_publisher.API_URL = gh.url
+    days = [date(2026, 3, 2), date(2026, 3, 3), date(2026, 3, 4), date(2026, 3, 5)]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            github_publisher.CACHE_PATH = os.path.join(tmp, "before", ".github_publish.json")
+            use_dir(os.path.join(tmp, "before", "fondi_history"))
+
+            # Primo giorno: questa è anche la copia "vecchia" che resta nell'immagine
+            fondi_history.record(ISIN, days[0], 10.0)
+            shutil.copytree(os.path.join(tmp, "before"), os.path.join(tmp, "stale"))
+            fondi_history.record(ISIN, days[1], 10.5)
+            fondi_history.record(ISIN, days[2], 11.0)
+            check("Publish prima del riavvio", publish_history(), True)
+
+            # Riavvio: disco con la copia vecchia (solo il primo giorno), cache GitHub vecchia
+            github_publisher.CACHE_PATH = os.path.join(tmp, "stale", ".github_publish.json")
+            use_dir(os.path.join(tmp, "stale", "fondi_history"))
+            publisher = Publisher(token="test")
+            check("Punti recuperati da GitHub", fondi_history.merge_remote(ISIN, publisher), 2)
+            fondi_history.record(ISIN, days[3], 11.5)
+            for repo_path, local_path in fondi_history.repo_files(ISIN):
+                publisher.add(repo_path, local_path)
+            check("Publish dopo il riavvio", publisher.publish(), True)
+            check("Storico remoto completo", remote_days(os.path.join(tmp, "remote")), [d.isoformat() for d in days])
+
+            # Copie allineate: nessun download
+            use_dir(os.path.join(tmp, "stale", "fondi_history"))
+            check("Copie allineate: niente da fondere", fondi_history.merge_remote(ISIN, Publisher(token="test")), 0)
+    finally:
+        gh.stop()
+
+    print("Test storico fondi completati.")
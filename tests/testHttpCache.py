@@ -0,0 +1,44 @@
+import tempfile
+
+import scraper_fondi
+from utils import http_cache
+from utils.http_cache import HttpCache
+
+def check(name, result, expected):
+    if result == expected:
+        print(f"✅ {name}: OK ({result})")
+    else:
+        print(f"❌ {name}: atteso {expected}, ottenuto {result}")
+
+class FakeResponse:
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def broken_parser(html):
+    raise AttributeError("'NoneType' object has no attribute 'text'")
+
+def nav_parser(html):
+    return html.strip()
+
+if __name__ == "__main__":
+    http_cache.fetch = lambda url, headers=None: FakeResponse("12,34", headers={"ETag": '"v1"'})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = HttpCache(tmp)
+        check("Parser che solleva -> None", cache.get("https://example.com/a", broken_parser), None)
+        check("Nulla in cache dopo l'errore", cache.load("https://example.com/a"), None)
+        check("Parser valido", cache.get("https://example.com/b", nav_parser), "12,34")
+
+        # Un fondo con parser rotto non blocca gli altri: riga ERR con l'ultimo NAV valido
+        http_cache._cache = cache
+        scraper_fondi.parser_for = lambda url: broken_parser if "rotto" in url else nav_parser
+        fondi = [{"nome": "Rotto", "ISIN": "IT1", "url": "https://example.com/rotto"},
+                 {"nome": "Sano", "ISIN": "IT2", "url": "https://example.com/sano"}]
+        previous = {"nav_text_it": "10,00", "nav_float": "10.00", "last_success": "2026-03-02T10:00:00"}
+        rows = [scraper_fondi.refresh_fondo(f, previous) for f in fondi]
+        check("Fondo con parser rotto", (rows[0]["status"], rows[0]["nav_float"]), ("ERR", "10.00"))
+        check("Altro fondo aggiornato", (rows[1]["status"], rows[1]["nav_float"]), ("OK", "12.34"))
+
+    print("Test cache HTTP completati.")
@@ -0,0 +1,47 @@
+import io
+import json
+from utils import logger
+from utils.logger import log_debug, log_error, log_info
+
+def check(name, ok, detail=""):
+    print(f"✅ {name}: OK" if ok else f"❌ {name}: {detail}")
+
+class Lazy:
+    formatted = 0
+    def __str__(self):
+        Lazy.formatted += 1
+        return "lazy"
+
+if __name__ == "__main__":
+    out = io.StringIO()
+    logger.setup(stream=out, level="INFO", levels={})
+    log_info("prezzo %s = %.2f", "SWDA", 101.5)
+    log_debug("mai scritto %s", Lazy())
+    log_error("variazione +1.20% (senza argomenti)")
+    logger.shutdown()
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    check("Due righe JSON", len(lines) == 2, lines)
+    check("Formattazione lazy", lines[0]["msg"] == "prezzo SWDA = 101.50", lines[0])
+    check("Debug spento di default", Lazy.formatted == 0, Lazy.formatted)
+    check("Messaggi con % senza argomenti", lines[1]["msg"] == "variazione +1.20% (senza argomenti)", lines[1])
+    check("Livello e modulo", (lines[1]["level"], lines[1]["module"]) == ("ERROR", "__main__"), lines[1])
+
+    out = io.StringIO()
+    logger.setup(stream=out, level="INFO", levels=logger.parse_levels("__main__=DEBUG"))
+    log_debug("debug attivo per modulo %s", Lazy())
+    logger.shutdown()
+    check("Livello per modulo (LOG_LEVELS)", "debug attivo per modulo lazy" in out.getvalue(), out.getvalue())
+
+    out = io.StringIO()
+    logger.setup(stream=out, level="INFO", levels={})
+    try:
+        raise ValueError("pagina non valida")
+    except ValueError:
+        log_error("scraping fallito per %s", "SWDA", exc_info=True)
+    logger.shutdown()
+    entry = json.loads(out.getvalue())
+    check("Messaggio pulito con exc_info", entry["msg"] == "scraping fallito per SWDA", entry)
+    check("Traceback in \"exc\"", "ValueError: pagina non valida" in entry.get("exc", ""), entry)
+
+    print("Test logger completati.")
@@ -0,0 +1,108 @@
+import os
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from scheduler import OneShot, Scheduler, alert_slot, backup_slot, close_slot, default_tasks, report_slot
+
+ROME = ZoneInfo("Europe/Rome")
+
+def check(name, result, expected):
+    if result == expected:
+        print(f"✅ {name}: OK ({result})")
+    else:
+        print(f"❌ {name}: atteso {expected}, ottenuto {result}")
+
+class FakeJob:
+    def __init__(self, kind):
+        self.id = kind
+        self.status = "running"
+
+def make_scheduler(path, submitted, tasks=None):
+    def submit(kind, fn):
+        submitted.append(kind)
+        return FakeJob(kind)
+    return Scheduler(lambda progress=None: None, tasks or default_tasks(None), state_path=path,
+                     refresh_minutes=10, jitter=60, submit=submit, rng=random.Random(1),
+                     lock_dir=os.path.join(os.path.dirname(path), "locks"))
+
+def at(*args):
+    return datetime(*args, tzinfo=ROME)
+
+if __name__ == "__main__":
+    # Slot
+    check("Backup: lunedì 07:15", backup_slot(at(2026, 3, 11, 12, 0)), at(2026, 3, 9, 7, 15))
+    check("Backup: lunedì prima delle 07:15", backup_slot(at(2026, 3, 9, 7, 0)), at(2026, 3, 2, 7, 15))
+    check("Report: 1° feriale", report_slot(at(2026, 4, 20, 9, 0)), at(2026, 4, 1, 7, 15))
+    check("Report: 1° di domenica -> lunedì 2", report_slot(at(2026, 3, 5, 9, 0)), at(2026, 3, 2, 7, 15))
+    check("Alert: sabato -> venerdì", alert_slot(at(2026, 3, 7, 20, 0)), at(2026, 3, 6, 19, 15))
+    check("Chiusura: Venerdì Santo -> giovedì", close_slot(at(2026, 4, 3, 23, 30)), at(2026, 4, 2, 23, 0))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scheduler_state.json")
+        submitted = []
+        s = make_scheduler(path, submitted)
+
+        # Primo avvio di martedì pomeriggio: niente recuperi fuori tolleranza, solo il refresh
+        check("Primo tick a mercato aperto", s.tick(at(2026, 3, 10, 15, 0)), ["update-all"])
+        check("Nessun doppio refresh entro l'intervallo", s.tick(at(2026, 3, 10, 15, 5)), [])
+        due = datetime.fromisoformat(s.state["refresh_at"])
+        check("Jitter entro +/-60s", abs((due - at(2026, 3, 10, 15, 10)).total_seconds()) <= 60, True)
+        check("Refresh alla scadenza", s.tick(due + timedelta(seconds=1)), ["update-all"])
+
+        # Alert alle 19:15, una sola volta
+        check("Alert 19:15", "alert" in s.tick(at(2026, 3, 10, 19, 15, 5)), True)
+        check("Alert non ripetuto", "alert" in s.tick(at(2026, 3, 10, 19, 17)), False)
+
+        # Notte: nessun refresh, run di chiusura una volta
+        check("Run di chiusura 23:00", s.tick(at(2026, 3, 10, 23, 1)), ["close"])
+        check("Notte senza refresh", s.tick(at(2026, 3, 11, 3, 0)), [])
+
+        # Macchina sospesa dalle 03:00 alle 09:00 di lunedì: backup recuperato
+        fired = s.tick(at(2026, 3, 16, 9, 0))
+        check("Backup recuperato dopo sospensione", "backup" in fired, True)
+        check("Alert di venerdì fuori tolleranza saltato", "alert" in fired, False)
+
+        # Stato persistito: un nuovo processo non rilancia il backup
+        submitted.clear()
+        s2 = make_scheduler(path, submitted)
+        check("Stato ricaricato da file", "backup" in s2.tick(at(2026, 3, 16, 9, 1)), False)
+
+        # Coalescenza: la run di chiusura usa lo stesso tipo di job di /api/update-all
+        check("Chiusura -> job update-all", [t.kind for t in s.tasks if t.name == "close"], ["update-all"])
+
+    # Due processi con lo scheduler attivo (es. due worker): lo slot lo prende uno solo
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scheduler_state.json")
+        fired = []
+        schedulers = [make_scheduler(path, []) for _ in range(4)]
+        threads = [threading.Thread(target=lambda s=s: fired.extend(s.tick(at(2026, 3, 10, 19, 15, 5))))
+                   for s in schedulers]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        check("Alert lanciato da un solo scheduler", fired.count("alert"), 1)
+
+        # Il runner del one-shot gira sotto il single-flight del task: stesso slot = una run
+        runs = []
+
+        def alert(progress=None):
+            runs.append(1)
+            threading.Event().wait(0.3)
+            return "triggered"
+
+        s = make_scheduler(path, [])
+        task = OneShot("alert", alert_slot, timedelta(minutes=5), alert)
+        runner = s._guarded(task, at(2026, 3, 11, 19, 15))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(runner())) for _ in range(3)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        check("One-shot eseguito una volta", (len(runs), results), (1, ["triggered"] * 3))
+
+    print("Test scheduler completati.")
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.singleflight import FlightError, SingleFlight
+
+def check(name, result, expected):
+    if result == expected:
+        print(f"✅ {name}: OK ({result})")
+    else:
+        print(f"❌ {name}: atteso {expected}, ottenuto {result}")
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        flight = SingleFlight("update", folder=tmp, poll=0.01)
+        calls = []
+
+        def slow(value):
+            calls.append(value)
+            time.sleep(0.3)
+            return {"value": value, "n": len(calls)}
+
+        # 8 chiamate contemporanee: una sola run, stesso risultato per tutti
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda i: flight.run(slow, i), range(8)))
+        check("Una sola esecuzione", len(calls), 1)
+        check("Stesso risultato per tutti", len({json.dumps(r, sort_keys=True) for r in results}), 1)
+        check("Lock rilasciato", os.path.exists(flight.lock_path), False)
+
+        # Chiavi diverse: la seconda attende la fine della prima e poi esegue la propria
+        calls.clear()
+        order = []
+
+        def tagged(tag):
+            order.append(f"start-{tag}")
+            time.sleep(0.2)
+            order.append(f"end-{tag}")
+            return tag
+
+        t = threading.Thread(target=lambda: flight.run(tagged, "a", key="a"))
+        t.start()
+        time.sleep(0.05)
+        check("Chiave diversa eseguita dopo", flight.run(tagged, "b", key="b"), "b")
+        t.join()
+        check("Run serializzate", order, ["start-a", "end-a", "start-b", "end-b"])
+
+        # Errore della run: chi si aggancia riceve FlightError
+        def failing():
+            time.sleep(0.2)
+            raise ValueError("pagina non disponibile")
+
+        errors = []
+
+        def attach():
+            try:
+                flight.run(failing)
+            except FlightError as e:
+                errors.append("flight")
+            except ValueError:
+                errors.append("leader")
+
+        threads = [threading.Thread(target=attach) for _ in range(3)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        check("Errore propagato (leader + agganciati)", sorted(errors), ["flight", "flight", "leader"])
+
+        # Lock di un processo morto: recuperato subito
+        with open(flight.lock_path, "w", encoding="utf-8") as f:
+            json.dump({"token": "x", "key": "", "pid": 2 ** 22 + 12345, "host": os.uname().nodename}, f)
+        check("Lock di pid morto recuperato", flight.run(lambda: "ok"), "ok")
+
+        # Lock senza heartbeat oltre la soglia: recuperato
+        stale = SingleFlight("update", folder=tmp, stale_after=1, poll=0.01)
+        with open(stale.lock_path, "w", encoding="utf-8") as f:
+            json.dump({"token": "y", "key": "", "pid": 1, "host": "altro-host"}, f)
+        old = time.time() - 60
+        os.utime(stale.lock_path, (old, old))
+        check("Lock scaduto recuperato", stale.run(lambda: "ok"), "ok")
+
+    print("Test single-flight completati.")
@@ -0,0 +1,36 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from utils.trading_calendar import (
+    is_open, is_trading_day, n_trading_days_back, on_or_before, previous_trading_day,
+)
+
+ROME = ZoneInfo("Europe/Rome")
+
+def check(name, result, expected):
+    if result == expected:
+        print(f"✅ {name}: OK ({result})")
+    else:
+        print(f"❌ {name}: atteso {expected}, ottenuto {result}")
+
+if __name__ == "__main__":
+    # Sedute
+    check("Sabato", is_trading_day(date(2026, 3, 7)), False)
+    check("Venerdì Santo 2026", is_trading_day(date(2026, 4, 3)), False)
+    check("Pasquetta 2026", is_trading_day(date(2026, 4, 6)), False)
+    check("Vigilia di Natale", is_trading_day(date(2025, 12, 24)), False)
+    check("Martedì feriale", is_trading_day(date(2026, 3, 10)), True)
+
+    # Sedute precedenti
+    check("Seduta prima di lunedì", previous_trading_day(date(2026, 3, 9)), date(2026, 3, 6))
+    check("Seduta prima di martedì dopo Pasqua", previous_trading_day(date(2026, 4, 7)), date(2026, 4, 2))
+    check("On or before di Capodanno", on_or_before(date(2026, 1, 1)), date(2025, 12, 30))
+    check("5 sedute prima (cambio anno)", n_trading_days_back(date(2026, 1, 5), 5), date(2025, 12, 22))
+    check("300 sedute prima", n_trading_days_back(date(2026, 3, 10), 300) < date(2025, 1, 15), True)
+
+    # Orari
+    check("Aperto alle 10:00", is_open(datetime(2026, 3, 10, 10, 0, tzinfo=ROME)), True)
+    check("Chiuso alle 23:00", is_open(datetime(2026, 3, 10, 23, 0, tzinfo=ROME)), False)
+    check("Chiuso alle 07:00", is_open(datetime(2026, 3, 10, 7, 0, tzinfo=ROME)), False)
+    check("Aperto 21:30 UTC (22:30 Roma)", is_open(datetime(2026, 3, 10, 21, 30, tzinfo=ZoneInfo("UTC"))), True)
+
+    print("Test calendario di borsa completati.")
@@ -0,0 +1,166 @@
+import re
+from html.parser import HTMLParser
+
+# ---------------------------------------------------------
+# ESTRAZIONE MIRATA DA HTML (senza costruire il DOM)
+# ---------------------------------------------------------
+# Strategia: si cerca nel sorgente una stringa letterale rara (attributo/valore del tag
+# che interessa), si isola solo quel tag e se ne legge il testo. Se la struttura non è
+# quella attesa (testo annidato, markup strano) si passa a un parser a eventi che si
+# ferma al primo match. Nessun albero completo della pagina viene mai creato.
+
+_ATTR = re.compile(r"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+_NUMBER_IT = re.compile(r"\d{1,3}(\.\d{3})*,\d{2}")
+_LBL_PRICE = re.compile(r"lblPrice", re.I)
+_SKIP_TEXT = {"script", "style", "template"}  # come BeautifulSoup.get_text()
+
+TELEBORSA_PRICE_ID = "ctl00_phContents_ctlHeader_lblPrice"
+EURIZON_VALUE_CLASS = "product-dashboard-token-value-bold"
+
+
+def _parse_attrs(raw):
+    attrs = {}
+    for m in _ATTR.finditer(raw):
+        value = m.group(2) if m.group(2) is not None else m.group(3) if m.group(3) is not None else m.group(4)
+        attrs[m.group(1).lower()] = value or ""
+    return attrs
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _ElementText(HTMLParser):
+    """Parser a eventi: testo del primo <tag> che soddisfa match(attrs), poi si ferma."""
+
+    def __init__(self, tag, match):
+        super().__init__(convert_charrefs=True)
+        self.tag = tag
+        self.match = match
+        self.depth = 0
+        self.parts = []
+        self.found = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth:
+            if tag == self.tag:
+                self.depth += 1
+        elif tag == self.tag and self.match({k: v or "" for k, v in attrs}):
+            self.depth = 1
+
+    def handle_endtag(self, tag):
+        if self.depth and tag == self.tag:
+            self.depth -= 1
+            if not self.depth:
+                self.found = "".join(p.strip() for p in self.parts)
+                raise _StopParsing
+
+    def handle_data(self, data):
+        if self.depth:
+            self.parts.append(data)
+
+
+class _FirstNumber(HTMLParser):
+    """Parser a eventi: primo numero in formato italiano (1.234,56) nel testo visibile."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip = 0
+        self.found = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TEXT:
+            self.skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TEXT and self.skip:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if not self.skip:
+            m = _NUMBER_IT.search(data)
+            if m:
+                self.found = m.group(0)
+                raise _StopParsing
+
+
+def _stream(parser, html):
+    try:
+        parser.feed(html)
+        parser.close()
+    except _StopParsing:
+        pass
+    return parser.found
+
+
+def _positions(html, needle):
+    if isinstance(needle, str):
+        pos = html.find(needle)
+        while pos != -1:
+            yield pos
+            pos = html.find(needle, pos + 1)
+    else:
+        for m in needle.finditer(html):
+            yield m.start()
+
+
+def element_text(html, tag, needle, match):
+    """
+    Testo (strip) del primo <tag> i cui attributi soddisfano match(attrs).
+    `needle` (stringa letterale o regex precompilata) è presente nel tag cercato e serve
+    a saltare direttamente ai candidati.
+    """
+    open_tag = f"<{tag}"
+    for start in _positions(html, needle):
+        lt = html.rfind("<", 0, start)
+        gt = html.find(">", start)
+        if (
+            lt != -1 and gt != -1
+            and html.find(">", lt, start) == -1  # needle dentro il tag, non nel testo
+            and html[lt:lt + len(open_tag)].lower() == open_tag
+            and html[lt + len(open_tag)] in " \t\r\n/>"
+        ):
+            if match(_parse_attrs(html[lt + len(open_tag):gt])):
+                end = html.find("<", gt + 1)
+                if end != -1 and html.startswith(f"</{tag}", end):
+                    text = html[gt + 1:end]
+                    if "&" not in text:
+                        return text.strip()
+                # testo annidato o entità: parser a eventi dal tag trovato in poi
+                return _stream(_ElementText(tag, match), html[lt:])
+    return None
+
+
+def first_number_it(html):
+    """Primo importo in formato italiano nel testo della pagina (fallback generico)."""
+    return _stream(_FirstNumber(), html)
+
+
+# ---------------------------------------------------------
+# ESTRATTORI PER SITO
+# ---------------------------------------------------------
+def ls_tc_mid(html, item_id):
+    """ls-tc.de: <span field="mid" item="{item_id}@1">12,34</span>"""
+    item = f"{item_id}@1"
+    return element_text(
+        html, "span", item,
+        lambda a: a.get("item") == item and a.get("field") == "mid",
+    ) or None
+
+
+def eurizon_nav(html):
+    """eurizoncapital.com: <span class="product-dashboard-token-value-bold">"""
+    text = element_text(
+        html, "span", EURIZON_VALUE_CLASS,
+        lambda a: EURIZON_VALUE_CLASS in a.get("class", "").split(),
+    )
+    return text or first_number_it(html)
+
+
+def teleborsa_price(html):
+    """teleborsa.it: span con id ...lblPrice"""
+    text = element_text(html, "span", TELEBORSA_PRICE_ID, lambda a: a.get("id") == TELEBORSA_PRICE_ID)
+    if text:
+        return text
+    text = element_text(html, "span", _LBL_PRICE, lambda a: bool(_LBL_PRICE.search(a.get("id", ""))))
+    return text or first_number_it(html)
@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.logger import log_info, log_error
+from utils.metrics import observe_http
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+
+# ---------------------------------------------------------
+# PARAMETRI MOTORE DI FETCH
+# ---------------------------------------------------------
+POOL_SIZE = 10             # connessioni keep-alive per host nel pool
+PER_HOST_LIMIT = 4         # richieste contemporanee massime verso lo stesso host
+MAX_WORKERS = 8            # thread di fetch per fetch_all()
+CONNECT_TIMEOUT = 5        # secondi
+READ_TIMEOUT = 15          # secondi
+RETRIES = 2                # tentativi extra dopo il primo
+BACKOFF = 0.5              # secondi, raddoppia ad ogni retry
+RUN_DEADLINE = 60          # secondi massimi per un intero fetch_all()
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# SESSIONE CONDIVISA (keep-alive)
+# ---------------------------------------------------------
+def get_session():
+    """Sessione requests condivisa dal processo, con pool di connessioni keep-alive."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update(HEADERS)
+                _session = s
+    return _session
+
+
+def _host_slot(host):
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(PER_HOST_LIMIT)
+            _host_slots[host] = slot
+        return slot
+
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+# ---------------------------------------------------------
+# FETCH SINGOLO CON RETRY/BACKOFF
+# ---------------------------------------------------------
+def fetch(url, deadline=None, retries=RETRIES, headers=None):
+    """
+    GET con sessione condivisa, limite per host e retry con backoff esponenziale.
+    Ritorna la Response oppure None (errori già loggati).
+    """
+    session = get_session()
+    host = urlsplit(url).netloc
+    slot = _host_slot(host)
+    last_error = None
+
+    for attempt in range(retries + 1):
+        remaining = _remaining(deadline)
+        if remaining is not None and remaining <= 0:
+            last_error = "deadline superata"
+            break
+
+        read_timeout = READ_TIMEOUT if remaining is None else max(0.1, min(READ_TIMEOUT, remaining))
+        with slot:
+            t0 = time.perf_counter()
+            try:
+                r = session.get(url, headers=headers, timeout=(CONNECT_TIMEOUT, read_timeout))
+                observe_http(host, r.status_code, time.perf_counter() - t0)
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()
+                    return r
+                last_error = f"HTTP {r.status_code}"
+            except requests.HTTPError as e:
+                # 4xx diversi da 429: inutile riprovare
+                log_error("Errore fetch %s: %s", url, e)
+                return None
+            except requests.RequestException as e:
+                observe_http(host, "error", time.perf_counter() - t0)
+                last_error = e
+
+        if attempt < retries:
+            pause = BACKOFF * (2 ** attempt) * (1 + random.random() / 2)
+            remaining = _remaining(deadline)
+            if remaining is not None:
+                pause = min(pause, max(0, remaining))
+            time.sleep(pause)
+
+    log_error("Errore fetch %s: %s", url, last_error)
+    return None
+
+
+# ---------------------------------------------------------
+# FETCH PARALLELO
+# ---------------------------------------------------------
+def fetch_all(urls, parse=None, max_workers=MAX_WORKERS, run_deadline=RUN_DEADLINE):
+    """
+    Scarica tutti gli URL in parallelo (concorrenza limitata per host) entro run_deadline secondi.
+    Se parse è indicato viene applicato nel worker a ogni Response (parse(url, response)).
+    Ritorna una lista nello stesso ordine di urls; None per i fetch falliti o fuori tempo.
+    """
+    results = [None] * len(urls)
+    if not urls:
+        return results
+
+    deadline = time.monotonic() + run_deadline
+    started = time.monotonic()
+
+    def work(url):
+        r = fetch(url, deadline=deadline)
+        if r is None:
+            return None
+        if parse is None:
+            return r
+        try:
+            return parse(url, r)
+        except Exception as e:
+            log_error("Errore parsing %s: %s", url, e)
+            return None
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls))))
+    futures = {executor.submit(work, url): i for i, url in enumerate(urls)}
+    try:
+        for fut in as_completed(futures, timeout=max(0, _remaining(deadline))):
+            results[futures[fut]] = fut.result()
+    except FuturesTimeout:
+        pending = sum(1 for f in futures if not f.done())
+        log_error("Deadline di %ss superata: %s fetch non completati", run_deadline, pending)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    ok = sum(1 for r in results if r is not None)
+    log_info("Fetch parallelo completato: %s/%s in %.2fs", ok, len(urls), time.monotonic() - started)
+    return results
@@ -1,27 +1,2 @@
-from datetime import date
-
-def easter_date(year):
-    a = year % 19
-    b = year // 100
-    c = year % 100
-    d = b // 4
-    e = b % 4
-    f = (b + 8) // 25
-    g = (b - f + 1) // 3
-    h = (19 * a + b - d - g + 15) % 30
-    i = c // 4
-    k = c % 4
-    l = (32 + 2 * e + 2 * i - h - k) % 7
-    m = (a + 11 * h + 22 * l) // 451
-    month = (h + l - 7 * m + 114) // 31
-    day = ((h + l - 7 * m + 114) % 31) + 1
-    return date(year, month, day)
-
-def is_holiday(d):
-    fixed = [(1,1), (4,25), (5,1), (6,2), (8,15), (12,25), (12,26)]
-    if (d.month, d.day) in fixed:
-        return True
-    easter = easter_date(d.year)
-    if d == easter or d == easter + timedelta(days=1):
-        return True
-    return False
\ No newline at end of file
+# Festività e Pasqua: unica definizione in utils/trading_calendar.py
+from utils.trading_calendar import easter_date, holidays, is_holiday  # noqa: F401
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from utils.fetcher import fetch
+from utils.logger import log_debug, log_error
+from utils.metrics import HTTP_CACHE
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "data", "http_cache")
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)", re.I)
+
+
+# ---------------------------------------------------------
+# CACHE HTTP SU DISCO (richieste condizionali)
+# ---------------------------------------------------------
+# Per ogni URL si salvano solo i validatori (ETag / Last-Modified), la freschezza
+# (max-age) e il valore già estratto dalla pagina: con un 304 il valore si riusa
+# così com'è, senza scaricare né parsare l'HTML.
+def _freshness(r):
+    cc = r.headers.get("Cache-Control", "")
+    if "no-store" in cc or "no-cache" in cc:
+        return 0
+    m = _MAX_AGE.search(cc)
+    if not m:
+        return 0
+    try:
+        age = int(r.headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(0, int(m.group(1)) - age)
+
+
+class HttpCache:
+    def __init__(self, folder=CACHE_DIR):
+        self.folder = folder
+
+    def _path(self, url):
+        return os.path.join(self.folder, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, url):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry if entry.get("url") == url else None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log_error("Cache HTTP illeggibile per %s: %s", url, e)
+            return None
+
+    def store(self, entry):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(entry["url"])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def get(self, url, parse, key=None):
+        """
+        Valore estratto con parse(html) dalla pagina url, passando dalla cache:
+        - entro max-age: nessuna richiesta;
+        - altrimenti GET condizionale: su 304 si riusa il valore salvato senza parsing.
+        `key` identifica il parser: se cambia, il valore in cache non vale più.
+        Ritorna None se il fetch o il parsing falliscono.
+        """
+        key = key or getattr(parse, "__name__", "")
+        now = time.time()
+        entry = self.load(url)
+        if entry and entry.get("parser") != key:
+            entry = None
+
+        if entry and now < entry.get("fetched_at", 0) + entry.get("max_age", 0):
+            HTTP_CACHE.inc(result="fresh")
+            return entry["value"]
+
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = fetch(url, headers=headers or None)
+        if r is None:
+            return None
+
+        if r.status_code == 304 and entry:
+            HTTP_CACHE.inc(result="revalidated")
+            entry["fetched_at"] = now
+            entry["max_age"] = _freshness(r)
+            self.store(entry)
+            log_debug("Cache HTTP: %s invariata (304)", url)
+            return entry["value"]
+
+        HTTP_CACHE.inc(result="miss")
+        try:
+            value = parse(r.text)
+        except Exception as e:
+            # una pagina cambiata non deve far fallire l'intero aggiornamento
+            log_error("Parsing fallito per %s: %s: %s", url, type(e).__name__, e)
+            return None
+        if value is None:
+            return None
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        if etag or last_modified or _freshness(r):
+            self.store({
+                "url": url,
+                "parser": key,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": now,
+                "max_age": _freshness(r),
+                "value": value,
+            })
+        return value
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = HttpCache()
+    return _cache
@@ -1,7 +1,159 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
 from datetime import datetime
 
-def log_info(msg):
-    print(f"[{datetime.now().isoformat()}] INFO {msg}")
+# ---------------------------------------------------------
+# LOGGING STRUTTURATO (JSON lines, handler in background)
+# ---------------------------------------------------------
+# Configurazione da ambiente:
+#   LOG_LEVEL   livello di default (INFO; DEBUG è spento)
+#   LOG_LEVELS  livelli per modulo, es. "scraper_etf=DEBUG,utils.fetcher=WARNING"
+#   LOG_FORMAT  "json" (default) oppure "text" ([timestamp] LEVEL messaggio)
+#
+# I messaggi accettano argomenti alla %: log_debug("prezzo %s = %.2f", sym, p) formatta
+# la stringa solo se il livello è attivo. La scrittura su stdout avviene in un thread
+# dedicato (QueueListener): chi logga accoda il record e prosegue.
 
-def log_error(msg):
-    print(f"[{datetime.now().isoformat()}] ERROR {msg}")
\ No newline at end of file
+ROOT = "portfolio"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "module": record.name[len(ROOT) + 1:] or ROOT,
+            "msg": record.getMessage(),
+        }
+        exc = _exc_text(self, record)
+        if exc:
+            entry["exc"] = exc
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"[{datetime.fromtimestamp(record.created).isoformat()}] {record.levelname} {record.getMessage()}"
+        exc = _exc_text(self, record)
+        if exc:
+            line += "\n" + exc
+        return line
+
+
+def _exc_text(formatter, record):
+    """Traceback del record: già formattato da _QueueHandler.prepare (exc_text) o da formattare."""
+    if record.exc_info:
+        return formatter.formatException(record.exc_info)
+    return record.exc_text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler.prepare fonde il traceback in msg e azzera exc_info/exc_text: qui msg resta
+    il solo messaggio e il traceback viaggia in exc_text, così JsonFormatter lo mette in "exc".
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def parse_levels(spec):
+    """'mod=DEBUG,altro=WARNING' -> {"mod": 10, "altro": 30} (voci non valide ignorate)."""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+_listener = None
+_setup_lock = threading.Lock()
+_loggers = {}
+
+
+def setup(stream=None, level=None, levels=None, fmt=None):
+    """Configura (o riconfigura) il logger radice dell'app. Chiamata automaticamente all'import."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+
+        root = logging.getLogger(ROOT)
+        root.handlers.clear()
+        root.propagate = False
+        root.setLevel(logging.getLevelName((level or os.environ.get("LOG_LEVEL", "INFO")).upper()))
+
+        handler = logging.StreamHandler(stream or sys.stdout)
+        fmt = fmt or os.environ.get("LOG_FORMAT", "json")
+        handler.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+        q = queue.SimpleQueue()
+        root.addHandler(_QueueHandler(q))
+        _listener = logging.handlers.QueueListener(q, handler, respect_handler_level=False)
+        _listener.start()
+
+        # i livelli per modulo si applicano anche ai logger già creati
+        for name in list(_loggers):
+            logging.getLogger(f"{ROOT}.{name}").setLevel(logging.NOTSET)
+        module_levels = levels if levels is not None else parse_levels(os.environ.get("LOG_LEVELS"))
+        for name, lvl in module_levels.items():
+            logging.getLogger(f"{ROOT}.{name}").setLevel(lvl)
+
+
+def shutdown():
+    """Svuota la coda (chiamata all'uscita del processo)."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(module):
+    logger = _loggers.get(module)
+    if logger is None:
+        logger = _loggers[module] = logging.getLogger(f"{ROOT}.{module}")
+    return logger
+
+
+def _caller_logger():
+    return get_logger(sys._getframe(2).f_globals.get("__name__", "main"))
+
+
+def log_debug(msg, *args):
+    logger = _caller_logger()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args)
+
+
+def log_info(msg, *args):
+    logger = _caller_logger()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(msg, *args)
+
+
+def log_warning(msg, *args):
+    _caller_logger().warning(msg, *args)
+
+
+def log_error(msg, *args, exc_info=False):
+    _caller_logger().error(msg, *args, exc_info=exc_info)
+
+
+setup()
+atexit.register(shutdown)
@@ -0,0 +1,203 @@
+import threading
+import time
+from bisect import bisect_left
+
+# ---------------------------------------------------------
+# METRICHE IN MEMORIA (formato testo Prometheus)
+# ---------------------------------------------------------
+# Registro minimo, senza dipendenze: contatori, gauge e istogrammi con etichette,
+# esposti da /metrics. I valori vivono nel processo (un worker gunicorn).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with _lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self):
+        with _lock:
+            items = sorted((k, ([*s[0]], s[1], s[2])) for k, s in self._values.items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _fmt(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+def render():
+    with _lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------
+# METRICHE DELL'APP
+# ---------------------------------------------------------
+STAGE_SECONDS = Histogram("portfolio_stage_seconds", "Durata delle fasi degli aggiornamenti", ("pipeline", "stage"))
+RUN_SECONDS = Gauge("portfolio_last_run_seconds", "Durata dell'ultima esecuzione", ("pipeline",))
+RUN_TIMESTAMP = Gauge("portfolio_last_run_timestamp_seconds", "Fine dell'ultima esecuzione (epoch)", ("pipeline",))
+RUNS = Counter("portfolio_runs_total", "Esecuzioni degli aggiornamenti per esito", ("pipeline", "status"))
+
+HTTP_SECONDS = Histogram("portfolio_http_request_seconds", "Latenza delle richieste HTTP in uscita per host", ("host",))
+HTTP_REQUESTS = Counter("portfolio_http_requests_total", "Richieste HTTP in uscita per host ed esito", ("host", "code"))
+
+SCRAPES = Counter("portfolio_scrape_total", "Esito dello scraping per simbolo/ISIN", ("source", "symbol", "result"))
+
+HTTP_CACHE = Counter("portfolio_http_cache_total", "Cache HTTP delle pagine NAV", ("result",))
+
+MARKET_STATUS_SECONDS = Histogram(
+    "portfolio_market_status_seconds", "Latenza di /api/market-status", ("code",), buckets=FAST_BUCKETS
+)
+SNAPSHOT_CACHE = Counter("portfolio_market_snapshot_total", "Letture dello snapshot market.json", ("result",))
+SINGLEFLIGHT = Counter(
+    "portfolio_singleflight_total", "Run degli aggiornamenti: eseguite, agganciate, in coda, lock rimossi", ("name", "role")
+)
+
+
+class StageTimer:
+    """
+    Callback di progresso che misura le fasi: ogni chiamata chiude la fase precedente
+    (osservata in STAGE_SECONDS) e inoltra il nome al progress del job, se c'è.
+    Come context manager registra anche durata ed esito dell'intera esecuzione.
+    """
+
+    def __init__(self, pipeline, progress=None):
+        self.pipeline = pipeline
+        self.progress = progress
+        self._current = None
+
+    def __call__(self, name, **info):
+        self._close()
+        self._current = (name, time.perf_counter())
+        if self.progress:
+            self.progress(name, **info)
+
+    def _close(self):
+        if self._current:
+            name, t0 = self._current
+            STAGE_SECONDS.observe(time.perf_counter() - t0, pipeline=self.pipeline, stage=name)
+            self._current = None
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._close()
+        RUN_SECONDS.set(round(time.perf_counter() - self._t0, 3), pipeline=self.pipeline)
+        RUN_TIMESTAMP.set(int(time.time()), pipeline=self.pipeline)
+        RUNS.inc(pipeline=self.pipeline, status="error" if exc_type else "ok")
+        return False
+
+
+def observe_http(host, code, seconds):
+    HTTP_SECONDS.observe(seconds, host=host)
+    HTTP_REQUESTS.inc(host=host, code=code)
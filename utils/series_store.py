@@ -0,0 +1,107 @@
+import mmap
+import os
+import re
+import threading
+from array import array
+
+# ---------------------------------------------------------
+# STORE COLONNARE (data, valore) SU FILE
+# ---------------------------------------------------------
+# Per ogni chiave due colonne affiancate:
+#   <chiave>.dates   -> int32   (date.toordinal())
+#   <chiave>.values  -> float64
+# ordinate per data, una riga per giorno. Lettura via mmap (zero copie).
+
+_SAFE_KEY = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class SeriesStore:
+    """Serie temporali giornaliere per chiave, su colonne binarie memory-mapped."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._maps = {}  # path -> (mtime_ns, size, memoryview)
+
+    def _path(self, key, column):
+        return os.path.join(self.folder, f"{_SAFE_KEY.sub('_', key)}.{column}")
+
+    def paths(self, key):
+        """File (dates, values) della chiave."""
+        return self._path(key, "dates"), self._path(key, "values")
+
+    def keys(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name[:-len(".dates")] for name in os.listdir(self.folder) if name.endswith(".dates"))
+
+    def _view(self, path, typecode):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return memoryview(array(typecode))
+
+        cached = self._maps.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        if st.st_size == 0:
+            view = memoryview(array(typecode))
+        else:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm).cast(typecode)
+        self._maps[path] = (st.st_mtime_ns, st.st_size, view)
+        return view
+
+    def columns(self, key):
+        """Ritorna (dates, values) come memoryview di sola lettura, allineate."""
+        dates = self._view(self._path(key, "dates"), "i")
+        values = self._view(self._path(key, "values"), "d")
+        n = min(len(dates), len(values))
+        return dates[:n], values[:n]
+
+    def upsert(self, key, points):
+        """
+        Inserisce/aggiorna punti {ordinale: valore}.
+        Caso comune (date nuove o stesso ultimo giorno): append/overwrite in coda.
+        Altrimenti riscrive le colonne con replace atomico.
+        """
+        if not points:
+            return
+        with self._lock:
+            os.makedirs(self.folder, exist_ok=True)
+            dates, values = self.columns(key)
+            last = dates[-1] if len(dates) else None
+            new = sorted(points.items())
+
+            if last is None or new[0][0] >= last:
+                self._append(key, new, overwrite_last=(last is not None and new[0][0] == last))
+            else:
+                merged = dict(zip(dates.tolist(), values.tolist()))
+                merged.update(points)
+                self._rewrite(key, sorted(merged.items()))
+
+    def _append(self, key, new, overwrite_last):
+        # Mai troncare: le colonne possono essere mappate da un lettore (SIGBUS su pagine tagliate)
+        for column, typecode, items in (
+            ("dates", "i", [d for d, _ in new]),
+            ("values", "d", [v for _, v in new]),
+        ):
+            path = self._path(key, column)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(0, os.SEEK_END)
+                if overwrite_last:
+                    f.seek(-array(typecode).itemsize, os.SEEK_END)
+                f.write(array(typecode, items).tobytes())
+
+    def _rewrite(self, key, ordered):
+        for column, typecode, items in (
+            ("dates", "i", [d for d, _ in ordered]),
+            ("values", "d", [v for _, v in ordered]),
+        ):
+            path = self._path(key, column)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(array(typecode, items).tobytes())
+            os.replace(tmp, path)
@@ -0,0 +1,204 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from utils.logger import log_info, log_error
+from utils.metrics import SINGLEFLIGHT
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCK_DIR = os.path.join(BASE_DIR, "data", "locks")
+
+STALE_AFTER = float(os.environ.get("SINGLEFLIGHT_STALE", "900"))  # secondi senza heartbeat = lock abbandonato
+HEARTBEAT = 30      # secondi tra due rinnovi del lock da parte di chi esegue
+POLL = 0.5          # secondi tra due controlli di chi attende
+HOST = socket.gethostname()
+
+
+# ---------------------------------------------------------
+# SINGLE-FLIGHT TRA THREAD E WORKER (lock file + file risultato)
+# ---------------------------------------------------------
+# Chi crea <nome>.lock con O_EXCL esegue la run, rinnova il lock (mtime) ogni HEARTBEAT
+# secondi e a fine run scrive <nome>.result.json con il token della run. Chi trova il lock
+# con la stessa chiave attende quel risultato invece di partire; con una chiave diversa
+# (es. altri ISIN) attende la fine e poi esegue la propria. Un lock senza heartbeat da
+# STALE_AFTER secondi, o di un processo morto sullo stesso host, viene rimosso.
+class FlightError(RuntimeError):
+    """La run condivisa a cui ci si è agganciati è fallita."""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SingleFlight:
+    def __init__(self, name, folder=None, stale_after=None, poll=POLL):
+        folder = folder or LOCK_DIR
+        self.name = name
+        self.folder = folder
+        self.stale_after = stale_after
+        self.poll = poll
+        self.lock_path = os.path.join(folder, f"{name}.lock")
+        self.result_path = os.path.join(folder, f"{name}.result.json")
+
+    # ----- lock -----
+    def _acquire(self, key):
+        os.makedirs(self.folder, exist_ok=True)
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"token": token, "key": key, "pid": os.getpid(), "host": HOST, "started_at": time.time()}, f)
+        return token
+
+    def _read_lock(self):
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            info["mtime"] = os.stat(self.lock_path).st_mtime
+            return info
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # lock appena creato e non ancora scritto: si riprova al giro dopo
+            try:
+                return {"mtime": os.stat(self.lock_path).st_mtime}
+            except FileNotFoundError:
+                return None
+
+    def _is_stale(self, info):
+        stale_after = self.stale_after if self.stale_after is not None else STALE_AFTER
+        if time.time() - info["mtime"] > stale_after:
+            return True
+        return info.get("host") == HOST and "pid" in info and not _pid_alive(info["pid"])
+
+    def _break(self, info):
+        """Rimuove un lock abbandonato (solo se è ancora quello letto)."""
+        current = self._read_lock()
+        if current and current.get("token") == info.get("token"):
+            try:
+                os.remove(self.lock_path)
+                SINGLEFLIGHT.inc(name=self.name, role="stale")
+                log_error(f"Single-flight {self.name}: lock abbandonato rimosso (pid {info.get('pid')})")
+            except FileNotFoundError:
+                pass
+
+    def _heartbeat(self, stop):
+        while not stop.wait(HEARTBEAT):
+            try:
+                os.utime(self.lock_path)
+            except FileNotFoundError:
+                return
+
+    # ----- risultato -----
+    def _write_result(self, entry):
+        tmp = f"{self.result_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp, self.result_path)
+
+    def _read_result(self, token):
+        try:
+            with open(self.result_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry if entry.get("token") == token else None
+
+    # ----- esecuzione -----
+    def run(self, fn, *args, key="", on_wait=None, **kwargs):
+        """
+        Esegue fn(*args, **kwargs) se nessun'altra run è in corso, altrimenti si aggancia a
+        quella con la stessa `key` e ne ritorna il risultato (letto dal file, quindi JSON:
+        le tuple diventano liste). on_wait(): chiamata una volta se si resta in attesa.
+        """
+        waited = False
+        while True:
+            token = self._acquire(key)
+            if token:
+                return self._lead(token, key, fn, args, kwargs)
+
+            info = self._read_lock()
+            if info is None:
+                continue
+            if self._is_stale(info):
+                self._break(info)
+                continue
+
+            if not waited:
+                waited = True
+                same = info.get("key") == key
+                SINGLEFLIGHT.inc(name=self.name, role="attached" if same else "queued")
+                log_info(f"Single-flight {self.name}: run in corso (pid {info.get('pid')}), "
+                         f"{'aggancio al risultato' if same else 'attendo la fine'}")
+                if on_wait:
+                    on_wait()
+
+            if info.get("key") == key and info.get("token"):
+                entry = self._wait_result(info["token"])
+                if entry is not None:
+                    if entry.get("ok"):
+                        return entry.get("result")
+                    raise FlightError(f"run condivisa {self.name} fallita: {entry.get('error')}")
+            else:
+                time.sleep(self.poll)
+
+    def _lead(self, token, key, fn, args, kwargs):
+        SINGLEFLIGHT.inc(name=self.name, role="leader")
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(stop,), name=f"heartbeat-{self.name}", daemon=True).start()
+        entry = {"token": token, "key": key}
+        try:
+            result = fn(*args, **kwargs)
+            entry.update(ok=True, result=result)
+            return result
+        except Exception as e:
+            entry.update(ok=False, error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            stop.set()
+            entry["finished_at"] = time.time()
+            try:
+                self._write_result(entry)
+            except Exception as e:
+                log_error(f"Single-flight {self.name}: risultato non salvato: {e}")
+            try:
+                os.remove(self.lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _wait_result(self, token):
+        """Attende il risultato della run `token`; None se il lock sparisce senza risultato."""
+        while True:
+            entry = self._read_result(token)
+            if entry is not None:
+                return entry
+            info = self._read_lock()
+            if info is None or info.get("token") != token:
+                return self._read_result(token)
+            if self._is_stale(info):
+                self._break(info)
+                return None
+            time.sleep(self.poll)
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
@@ -0,0 +1,176 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# ---------------------------------------------------------
+# CALENDARIO DI BORSA LS-TC
+# ---------------------------------------------------------
+MARKET_TZ = ZoneInfo("Europe/Rome")
+
+# Orari mercato LS-TC
+MARKET_HOURS = {
+    "timezone": "Europe/Rome",
+    "open": "07:10",
+    "close": "22:55"
+}
+
+# Festività italiane fisse
+FIXED_HOLIDAYS = [
+    (1, 1),   # Capodanno
+    (4, 25),  # Liberazione
+    (5, 1),   # Lavoro
+    (6, 2),   # Repubblica
+    (8, 15),  # Ferragosto
+    (12, 24), # Vigilia di Natale (mercato chiuso)
+    (12, 25), # Natale
+    (12, 26), # Santo Stefano
+    (12, 31), # Ultimo dell'anno (mercato chiuso)
+]
+
+OPEN_TIME = time.fromisoformat(MARKET_HOURS["open"])
+CLOSE_TIME = time.fromisoformat(MARKET_HOURS["close"])
+
+
+@lru_cache(maxsize=None)
+def easter_date(year):
+    """Calcolo data di Pasqua (algoritmo di Meeus)."""
+    a = year % 19
+    b = year // 100
+    c = year % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = ((h + l - 7 * m + 114) % 31) + 1
+    return date(year, month, day)
+
+
+@lru_cache(maxsize=None)
+def holidays(year):
+    """Giorni feriali di chiusura dell'anno: fisse + Venerdì Santo, Pasqua, Pasquetta."""
+    easter = easter_date(year)
+    days = {date(year, m, d) for m, d in FIXED_HOLIDAYS}
+    days.update({easter - timedelta(days=2), easter, easter + timedelta(days=1)})
+    return frozenset(days)
+
+
+def is_holiday(d):
+    return d in holidays(d.year)
+
+
+class TradingCalendar:
+    """
+    Sedute di borsa precalcolate per anno, in un array ordinato di ordinali (più un set):
+    is_trading_day in O(1), previous_trading_day / n_trading_days_back con bisect.
+    Gli anni si aggiungono al primo uso (in entrambe le direzioni).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (primo anno, ultimo anno, ordinali ordinati delle sedute, set degli stessi):
+        # una sola tupla, sostituita con un'unica assegnazione
+        self._tables = (None, None, [], frozenset())
+
+    @staticmethod
+    def _year_sessions(year):
+        closed = holidays(year)
+        d = date(year, 1, 1)
+        out = []
+        while d.year == year:
+            if d.weekday() < 5 and d not in closed:
+                out.append(d.toordinal())
+            d += timedelta(days=1)
+        return out
+
+    def _ensure(self, year):
+        """Tabelle che coprono `year` (calcolate al primo uso)."""
+        tables = self._tables
+        if tables[0] is not None and tables[0] <= year <= tables[1]:
+            return tables
+        with self._lock:
+            old_first, old_last, _, _ = tables = self._tables
+            first = year if old_first is None else min(year, old_first)
+            last = year if old_last is None else max(year, old_last)
+            if (first, last) == (old_first, old_last):
+                return tables
+            sessions = []
+            for y in range(first, last + 1):
+                sessions.extend(self._year_sessions(y))
+            # pubblicazione in un colpo solo: i lettori vedono la tupla vecchia o la nuova
+            tables = (first, last, sessions, frozenset(sessions))
+            self._tables = tables
+            return tables
+
+    def is_trading_day(self, d):
+        return d.toordinal() in self._ensure(d.year)[3]
+
+    def is_open(self, now=None):
+        """Mercato aperto adesso (o all'istante `now`, convertito in ora di Roma)."""
+        now = datetime.now(MARKET_TZ) if now is None else now.astimezone(MARKET_TZ)
+        return self.is_trading_day(now.date()) and OPEN_TIME <= now.time() <= CLOSE_TIME
+
+    def on_or_before(self, d):
+        """Ultima seduta <= d."""
+        sessions = self._ensure(d.year)[2]
+        i = bisect_right(sessions, d.toordinal()) - 1
+        if i < 0:
+            self._ensure(d.year - 1)
+            return self.on_or_before(d)
+        return date.fromordinal(sessions[i])
+
+    def previous_trading_day(self, d):
+        """Ultima seduta < d."""
+        return self.on_or_before(d - timedelta(days=1))
+
+    def n_trading_days_back(self, d, n):
+        """La n-esima seduta prima di d (n=1 equivale a previous_trading_day)."""
+        first, _, sessions, _ = self._ensure(d.year)
+        while True:
+            i = bisect_left(sessions, d.toordinal()) - n
+            if i >= 0:
+                return date.fromordinal(sessions[i])
+            # servono anni precedenti: ~252 sedute l'anno
+            first, _, sessions, _ = self._ensure(first - (-i // 250 + 1))
+
+    def sessions(self, start, end):
+        """Sedute tra start ed end inclusi."""
+        self._ensure(start.year)
+        sessions = self._ensure(end.year)[2]
+        lo = bisect_left(sessions, start.toordinal())
+        hi = bisect_right(sessions, end.toordinal())
+        return [date.fromordinal(o) for o in sessions[lo:hi]]
+
+
+_calendar = TradingCalendar()
+
+
+def get_calendar():
+    return _calendar
+
+
+def is_trading_day(d):
+    return _calendar.is_trading_day(d)
+
+
+def is_open(now=None):
+    return _calendar.is_open(now)
+
+
+def on_or_before(d):
+    return _calendar.on_or_before(d)
+
+
+def previous_trading_day(d):
+    return _calendar.previous_trading_day(d)
+
+
+def n_trading_days_back(d, n):
+    return _calendar.n_trading_days_back(d, n)
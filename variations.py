@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+import numpy as np
+
+from utils.trading_calendar import on_or_before
+
+# ---------------------------------------------------------
+# PERIODI MULTI-VARIAZIONE
+# ---------------------------------------------------------
+PERIODS = {
+    "D":  (1,      "D"),
+    "W":  (7,      "W"),
+    "M":  (30,     "M"),
+    "Q":  (90,     "Q"),
+    "H":  (180,    "H"),
+    "Y":  (365,    "Y"),
+    "3":  (365*3,  "3Y"),
+    "5":  (365*5,  "5Y"),
+}
+
+VARIATION_KEYS = ("v1", "v2", "v3", "v_led", "v_alert", "v_bot")
+DEFAULT_CODES = {"v1": "D", "v2": "W", "v3": "M", "v_led": "M", "v_alert": "M", "v_bot": "M"}
+
+
+# ---------------------------------------------------------
+# MATRICE STORICA (simboli × date)
+# ---------------------------------------------------------
+def history_matrix(history, symbols):
+    """
+    Allinea lo storico di tutti i simboli sull'unione delle date.
+    Ritorna (dates, prices): dates int ordinali (T,), prices float (S, T) con forward-fill
+    (NaN prima della prima chiusura del simbolo).
+    """
+    columns = [history.columns(symbol) for symbol in symbols]
+    all_dates = [np.asarray(d, dtype=np.int64) for d, _ in columns if len(d)]
+    if not all_dates:
+        return np.empty(0, dtype=np.int64), np.full((len(symbols), 0), np.nan)
+
+    dates = np.unique(np.concatenate(all_dates))
+    prices = np.full((len(symbols), len(dates)), np.nan)
+    for i, (d, p) in enumerate(columns):
+        if len(d):
+            prices[i, np.searchsorted(dates, np.asarray(d, dtype=np.int64))] = np.asarray(p, dtype=np.float64)
+
+    # forward-fill lungo l'asse delle date
+    idx = np.where(np.isnan(prices), 0, np.arange(len(dates)))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    prices = prices[np.arange(len(symbols))[:, None], idx]
+    return dates, prices
+
+
+def lookback_targets(today_date, periods=PERIODS):
+    """
+    Data di riferimento di ogni periodo come ordinale: oggi meno i giorni del periodo,
+    riportata all'ultima seduta di borsa (mai un weekend o un festivo).
+    """
+    return np.array(
+        [on_or_before(today_date - timedelta(days=days)).toordinal() for days, _ in periods.values()],
+        dtype=np.int64,
+    )
+
+
+# ---------------------------------------------------------
+# MOTORE VETTORIALE
+# ---------------------------------------------------------
+def compute_variations(history, symbols, prices_today, today_date, periods=PERIODS):
+    """
+    Variazioni % di tutti i periodi per tutti i simboli in un solo passaggio.
+    Ritorna una matrice (simboli × periodi) nell'ordine di `periods`; NaN dove non calcolabile.
+    """
+    today = np.asarray(prices_today, dtype=np.float64)
+    dates, prices = history_matrix(history, symbols)
+    if not len(dates):
+        return np.full((len(symbols), len(periods)), np.nan)
+
+    cols = np.searchsorted(dates, lookback_targets(today_date, periods), side="right") - 1
+    past = np.where(cols >= 0, prices[:, np.maximum(cols, 0)], np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (today[:, None] - past) / past * 100.0
+    var[~np.isfinite(var)] = np.nan
+    return var
+
+
+def variations_by_code(row, periods=PERIODS):
+    """Riga della matrice -> {codice: float | None}, valori grezzi (non formattati)."""
+    return {code: (None if np.isnan(v) else float(v)) for code, v in zip(periods, row)}
+
+
+# ---------------------------------------------------------
+# FORMATTAZIONE (solo in uscita)
+# ---------------------------------------------------------
+def fmt_variation(value, suffix):
+    if value is None:
+        return "N/A"
+    sign = "+" if value >= 0 else ""
+    return f"{sign}{value:.2f}%{suffix}"
+
+
+def format_configured(variations, variation_config):
+    """Campi v1/v2/v3/v_led/v_alert/v_bot formattati secondo variations.conf."""
+    out = {}
+    for key in VARIATION_KEYS:
+        code = variation_config.get(key, DEFAULT_CODES[key])
+        if code not in PERIODS:
+            out[key] = "N/A"
+            continue
+        out[key] = fmt_variation(variations.get(code), PERIODS[code][1])
+    return out